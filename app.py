@@ -9,14 +9,17 @@ from flask_cors import CORS
 from dotenv import load_dotenv
 from flasgger import Swagger
 from flask_jwt_extended import JWTManager
+
+# services 모듈들이 import 시점에 BROWSER_* 등 환경 변수를 읽으므로 가장 먼저 .env를 불러옴
+load_dotenv()
+
 from services.browser import browser_service
+from services.browser_manager import global_browser_manager
 import asyncio
 
 # 모델과 DB 객체 임포트
 from models import db
 
-load_dotenv()
-
 # 라우트 임포트
 from routes.instagram import bp as instagram_bp
 from routes.places import user_places_bp
@@ -25,6 +28,7 @@ from routes.profile import bp as profile_bp
 from routes.home import bp as main_bp
 from routes.notice import bp as notification_bp
 from routes.ad import bp as ads_bp
+from routes.metrics import bp as metrics_bp
 
 # pymysql 설정
 pymysql.install_as_MySQLdb()
@@ -109,6 +113,10 @@ def create_app():
     app.register_blueprint(main_bp)
     app.register_blueprint(notification_bp)
     app.register_blueprint(ads_bp)
+    app.register_blueprint(metrics_bp)
+
+    # 첫 요청이 chromium 실행을 기다리지 않도록 브라우저 풀을 미리 띄움
+    global_browser_manager.warm_up()
 
     @app.before_request
     async def startup_browser():
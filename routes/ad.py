@@ -7,14 +7,15 @@ from ecdsa import VerifyingKey, BadSignatureError
 from ecdsa.util import sigdecode_der
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import time
-from services.browser_manager import global_browser_manager
 from flask import Blueprint, request, jsonify
 
-from services.redis_helper import redis_client, check_abuse_and_rate_limit, handle_fail_count, peek_score_and_target, create_ad_ticket, commit_score, verify_ad_ticket
+from services.redis_helper import redis_client, check_abuse_and_rate_limit, handle_fail_count, peek_score_and_target, create_ad_ticket, commit_score, verify_ad_ticket, get_post_eligibility, save_post_eligibility
 from services.my_logger import get_my_logger
-from routes.instagram import extract_shortcode, check_db_have_url
-from services.instagram_text_parser import get_caption_no_login, extract_places_with_gpt, is_place_post
-from services.check_post import extract_post_data
+from routes.instagram import extract_shortcode, check_db_have_url, busy_response
+from services.instagram_text_parser import get_caption_no_login, extract_places_with_gpt_async, is_place_post
+from services.post_snapshot import get_post_snapshot
+from services.browser_queue import BrowserBusyError, PRIORITY_PROBE
+from services.ocr_prefetch import schedule_ocr_prefetch
 
 # models 파일에서 정의한 클래스들 임포트
 from models import db, Place, InstaUrl, UrlPlace
@@ -100,7 +101,9 @@ async def extract_eligibility():
       401:
         description: 인증 실패
       429:
-        description: 요청 한도 초과
+        description: 요청 한도 초과 (이미 진행 중인 추출 존재 포함, Retry-After 헤더)
+      503:
+        description: 브라우저 작업 대기열 포화 (Retry-After 헤더, retry_after 초)
     """
     # 입력: 게시물 URL 로직: 이미 추출된 게시물인지 확인 → 이번 추출로 증가할 점수 계산 → 현재 잔여 점수 조회 응답: { score_cost, current_score, need_ad: bool, ticket_id } — need_ad가 true면 ticket_id도 같이 발급해서 광고에 실어 보냄
     user_id = int(get_jwt_identity())
@@ -142,45 +145,66 @@ async def extract_eligibility():
         # 2. 장소 확인 후 프론트에게 보낼 장소 정보 준비
         # Q. 가능하면 네이버 검색 돌리기 전에 저장되어있는지 파악하는게 좋을 듯
         # 캡션 추출
+        # 같은 게시물을 다른 유저가 먼저 확인했으면 그 결과 재사용
+        known = get_post_eligibility(shortcut) or {}
         if not db_caption:
-            caption = await get_caption_no_login(url)
-            if not caption:
-                return jsonify({'status': 'error', 'message': 'No caption'}), 400
-            is_place = is_place_post(caption)
+            if known.get("caption"):
+                caption, is_place = known["caption"], known.get("is_place", True)
+            else:
+                try:
+                    caption = await get_caption_no_login(url, user_id)
+                except BrowserBusyError as e:
+                    return busy_response(e)
+                if not caption:
+                    return jsonify({'status': 'error', 'message': 'No caption'}), 400
+                is_place = is_place_post(caption)
+                save_post_eligibility(shortcut, caption=caption, is_place=is_place)
             if not is_place:
                 handle_fail_count(user_id)
                 return jsonify({'status': 'error', 'message': "It is not a place post"}), 400
 
         # db_caption 이든 방금 새로 가져왔든, 캡션이 있으면 항상 검사
         caption_extract_start = time.time()
-        caption_place = extract_places_with_gpt(caption) 
+        caption_place = await extract_places_with_gpt_async(caption) # None이면 GPT 호출 실패
         caption_extract_end = time.time()
         logger.info(f"caption time: {caption_extract_end - caption_extract_start: .2f}s")
 
-        if caption_place == []:
+        carousel_count = known.get("carousel_count")
+        ocr_ready = known.get("ocr_ready", False)
+        carousel_complete = carousel_count is not None # 저장된 값은 complete 스냅샷에서 나온 것
+        if not caption_place:
             logger.debug("[3] OCR 시도")
             extract_type = "ocr"
 
-            playwright_obj, browser, context = await global_browser_manager.get_context()
-            page = await context.new_page()
-            try:
-                img_count = await extract_post_data(page, url)
-            finally:
+            if carousel_count is None:
                 try:
-                    await page.close()
-                except Exception:
-                    pass
-                await global_browser_manager.release(playwright_obj, browser, context)
-
-            if img_count == -1:
-                img_count = 2
+                    snapshot = await get_post_snapshot(url, user_id=user_id, priority=PRIORITY_PROBE)
+                except BrowserBusyError as e:
+                    return busy_response(e)
+                carousel_count = snapshot["carousel_count"]
+                ocr_ready = bool(snapshot["image_urls"])
+                carousel_complete = snapshot.get("complete", True)
+
+            img_count = 2 if carousel_count == -1 else carousel_count
             earned_score = 1.0 * img_count
             logger.info(f"[3] OCR - {earned_score}점")
+
+            # 광고 보는 동안 OCR 대상 이미지를 미리 받아 전처리
+            schedule_ocr_prefetch(url, shortcut)
         else :
             extract_type = "caption"
             logger.info("[2] 캡션 - 0.2점")
             earned_score = 0.2 # caption
 
+        # analyze 폴백에서 다시 계산하지 않도록 게시물 단위로 저장.
+        # 모든 유저가 공유하는 값이라 GPT 실패(None)나 불완전한 스냅샷의 이미지 수는 저장하지 않음
+        fields = {"caption": caption, "is_place": True}
+        if caption_place is not None:
+            fields.update(gpt_result=caption_place, extract_type=extract_type)
+        if carousel_complete:
+            fields.update(carousel_count=carousel_count, ocr_ready=ocr_ready)
+        save_post_eligibility(shortcut, **fields)
+
     redis_client.delete(f"fail_count:{user_id}")
 
     end = time.time()
@@ -199,7 +223,7 @@ async def extract_eligibility():
         "user_id": user_id,
         "shortcut": shortcut,               # db 검색용
         "extract_type": extract_type,       # "db" | "caption" | "ocr"
-        "gpt_result": caption_place,           # ocr인 경우 []
+        "gpt_result": caption_place or [],     # ocr인 경우 []
         'need_ad': need_ad,
         'ticket_id': ticket_id,
         "caption": caption,                 # DB 저장용
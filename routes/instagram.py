@@ -9,13 +9,15 @@ import re
 import threading
 
 
-from services.instagram_text_parser import get_caption_no_login, extract_places_with_gpt, is_place_post
+from services.instagram_text_parser import get_caption_no_login, extract_places_with_gpt_async, is_place_post
 from services.instagram_image_extracter import extract_insta_images
 from services.check_place import process_places
-from services.redis_helper import redis_client, check_abuse_and_rate_limit, handle_fail_count, commit_score
+from services.redis_helper import redis_client, check_abuse_and_rate_limit, handle_fail_count, commit_score, get_post_eligibility, save_post_eligibility
 from services.my_logger import get_my_logger
 from services.utils import get_full_photo_url
 from services.push_notification import send_extraction_notification
+from services.browser_queue import BrowserBusyError
+from services.photo_worker import enqueue_place_photos, photo_pending
 
 
 # models 파일에서 정의한 클래스들 임포트
@@ -108,6 +110,10 @@ async def analyze_instagram():
                     type: string
                     description: 대표 이미지 URL 또는 경로
                     example: "https://example.com/image.jpg"
+                  photo_pending:
+                    type: boolean
+                    description: 사진 수집 중이면 true (GET /places/photos 로 나중에 조회)
+                    example: false
             show_ad:
               type: boolean
               description: 보상형 광고 노출 여부 (해당 값이 true일 때만 프론트에서 광고 팝업 노출)
@@ -151,7 +157,7 @@ async def analyze_instagram():
               type: string
               example: "can not found places"
       429:
-        description: 요청 한도 초과 (분당 요청 횟수 초과 또는 연속 실패로 인한 임시 차단)
+        description: 요청 한도 초과 (분당 요청 횟수 초과, 연속 실패로 인한 임시 차단 또는 이미 진행 중인 추출 존재). Retry-After 헤더 포함될 수 있음
         schema:
           type: object
           properties:
@@ -161,6 +167,20 @@ async def analyze_instagram():
             message:
               type: string
               example: "요청이 너무 많습니다. 잠시 후 다시 시도해주세요."
+      503:
+        description: 브라우저 작업 대기열 포화. Retry-After 헤더와 retry_after(초) 반환
+        schema:
+          type: object
+          properties:
+            status:
+              type: string
+              example: "error"
+            message:
+              type: string
+              example: "서버가 혼잡합니다. 잠시 후 다시 시도해주세요."
+            retry_after:
+              type: integer
+              example: 12
       500:
         description: 서버 내부 오류
         schema:
@@ -172,6 +192,7 @@ async def analyze_instagram():
             message:
               type: string
     """ 
+    ad_ticket = None # (ticket_id, 적립할 점수) - 분석이 끝난 뒤(대기열 거절 제외) 적립
     try:
         user_id = int(get_jwt_identity())
 
@@ -209,8 +230,9 @@ async def analyze_instagram():
             if str(ticket.get("user_id")) != str(user_id):
                 return jsonify({'status': 'error', 'message': 'Forbidden'}), 403
             
-            commit_score(user_id, float(ticket.get("pending_score", 0)))
-            redis_client.hset(f"ad_ticket:{session_ticket_id}", "status", "used")
+            # 같은 티켓으로 동시에 분석하지 못하게 먼저 잠금. 점수 적립과 used 처리는 finally에서
+            redis_client.hset(f"ad_ticket:{session_ticket_id}", "status", "in_use")
+            ad_ticket = (session_ticket_id, float(ticket.get("pending_score", 0)))
 
         # redis 접근 : user_id 접근 > shortcut, extract_type 가져오기 
         # > db : shortcut으로 검색 
@@ -254,7 +276,7 @@ async def analyze_instagram():
               else:  # ocr
                   logger.info("[3] OCR 시도")
                   caption = extract_session.get("caption", "")
-                  img_count, candidates = await check_ocr_place(url)
+                  img_count, candidates = await cached_ocr_place(shortcut, url, user_id)
                   if not img_count or not candidates:
                       redis_client.delete(f"extract_session:{user_id}")
                       return jsonify({'status': 'success', 'message': "no location information found"}), 200
@@ -287,9 +309,13 @@ async def analyze_instagram():
 
             redis_client.delete(f"extract_session:{user_id}")
 
+        except BrowserBusyError:
+            raise
         except Exception as e:
             logger.warning(f"Redis 세션 실패, 기존 로직으로 폴백: {e}")
             db_caption = bool(caption)
+            # 다른 유저의 eligibility라도 같은 게시물이면 캡션/GPT/OCR 결과 재사용
+            known = get_post_eligibility(shortcut) or {}
             # 기존 로직 실행
             # 만약 reids 저장된 거에서 오류 뜨면 기존 로직으로 진행
 
@@ -304,12 +330,16 @@ async def analyze_instagram():
                 # Q. 가능하면 네이버 검색 돌리기 전에 저장되어있는지 파악하는게 좋을 듯
                 # 캡션 추출
                 if not db_caption:
-                    caption = await get_caption_no_login(url)
-                    if not caption:
-                        return jsonify({'status': 'error', 'message': 'No caption'}), 400
-                  
-                    # 장소 설명 게시물인지 확인
-                    is_place = is_place_post(caption)
+                    if known.get("caption"):
+                        caption, is_place = known["caption"], known.get("is_place", True)
+                    else:
+                        caption = await get_caption_no_login(url, user_id)
+                        if not caption:
+                            return jsonify({'status': 'error', 'message': 'No caption'}), 400
+
+                        # 장소 설명 게시물인지 확인
+                        is_place = is_place_post(caption)
+                        save_post_eligibility(shortcut, caption=caption, is_place=is_place)
                     if not is_place:
                         handle_fail_count(user_id) # 실패 처리
                         return jsonify({'status': 'error', 'message': "It is not a place post"}), 400
@@ -324,11 +354,16 @@ async def analyze_instagram():
                         db.session.rollback()
                         logger.error(f"InstaUrl 저장 실패: {e}")
                 # 캡션 파싱 로직
-                candidates = await check_caption_place(caption)
+                if known.get("gpt_result") is not None and known.get("caption") == caption:
+                    candidates = known["gpt_result"]
+                else:
+                    candidates = await check_caption_place(caption)
+                    if candidates is not None: # 일시적 GPT 오류는 다른 유저에게 공유하지 않음
+                        save_post_eligibility(shortcut, caption=caption, gpt_result=candidates)
 
                 if not candidates:
                     logger.info("[3] OCR 시도...")
-                    img_count, candidates = await check_ocr_place(url)
+                    img_count, candidates = await cached_ocr_place(shortcut, url, user_id)
                     if not img_count or not candidates:
                         return jsonify({'status': 'success', 'message': "Analysis completed, but no location information found"}), 200
                 to_search_naver = []
@@ -368,10 +403,22 @@ async def analyze_instagram():
         # 프론트에 보낼 장소 정보
         return jsonify({'status':'success', 'results': post_places}), 200
 
+    except BrowserBusyError as e:
+        if ad_ticket:
+            # 광고를 본 유저가 Retry-After 후 다시 요청할 수 있도록 티켓을 되돌림 (점수도 적립 안 함)
+            ticket_key = f"ad_ticket:{ad_ticket[0]}"
+            if redis_client.exists(ticket_key):
+                redis_client.hset(ticket_key, "status", "verified")
+            ad_ticket = None
+        return busy_response(e)
     except Exception as e:
         db.session.rollback()
         logger.exception("analyze_instagram 처리 중 오류")
         return jsonify({'status': 'error', 'message': str(e)}), 500
+    finally:
+        if ad_ticket:
+            commit_score(user_id, ad_ticket[1])
+            redis_client.hset(f"ad_ticket:{ad_ticket[0]}", "status", "used")
 
 def check_db_have_url(url=""):
     target_url = db.session.query(InstaUrl).filter(InstaUrl.url.like(f"%{url}%")).first()
@@ -410,7 +457,7 @@ def check_db_have_url(url=""):
     
 async def check_caption_place(caption=""):
     '''
-    캡션에서 장소 추출
+    캡션에서 장소 추출. 실패하면 None (게시물 단위 결과로 저장하지 않음)
     '''
     try:
         if not caption:
@@ -422,7 +469,9 @@ async def check_caption_place(caption=""):
 
         if not places:
             places = extract_places_with_gpt(caption)'''
-        places = extract_places_with_gpt(caption) # 비동기로 변경해야함
+        places = await extract_places_with_gpt_async(caption)
+        if places is None:
+            return None
         if not places:
             return []
         
@@ -431,9 +480,23 @@ async def check_caption_place(caption=""):
 
     except Exception as e:
         logger.error(f"서버 에러: {e}")        
-        return []
+        return None
+
+async def cached_ocr_place(shortcode, url, user_id=None):
+    '''
+    게시물 단위로 저장된 OCR 결과가 있으면 재사용, 없으면 OCR 후 저장
+    '''
+    known = get_post_eligibility(shortcode) or {}
+    if known.get("ocr_result"):
+        logger.info("[3] 저장된 OCR 결과 사용")
+        return known.get("ocr_count", 0), known["ocr_result"]
+
+    img_count, candidates = await check_ocr_place(url, user_id)
+    if img_count and candidates:
+        save_post_eligibility(shortcode, ocr_count=img_count, ocr_result=candidates)
+    return img_count, candidates
 
-async def check_ocr_place(url=""):
+async def check_ocr_place(url="", user_id=None):
 
     if not url:
         return [], []
@@ -442,7 +505,7 @@ async def check_ocr_place(url=""):
         start_total = time.time()
         logger.debug(f"분석 요청: {url}")
 
-        images, final_places = await extract_insta_images(url)
+        images, final_places = await extract_insta_images(url, user_id)
 
         if isinstance(final_places, dict) and "error" in final_places:
             logger.info(f"추출 실패: {final_places['error']}")
@@ -461,6 +524,8 @@ async def check_ocr_place(url=""):
         logger.debug(f"OCR 처리 시간: {total_time}s")
         return len(images), final_places
 
+    except BrowserBusyError:
+        raise
     except Exception as e:
         logger.error(f"서버 에러: {e}")
         return [], []
@@ -468,6 +533,7 @@ async def check_ocr_place(url=""):
 def save_places_to_db(url_id, new_places = []): 
     try :
         saved_places = []
+        no_photo = []
         for p_info in new_places:
             place = Place.query.filter(Place.gid == p_info['gid']).first()
 
@@ -512,13 +578,21 @@ def save_places_to_db(url_id, new_places = []):
                       "rating_avg": place.rating_avg,
                       "rating_count": place.rating_count,
                       "gid": place.gid,
-                      "photo": get_full_photo_url(place.photo)
+                      "photo": get_full_photo_url(place.photo),
+                      "photo_pending": False
                   }
+            if not place.photo:
+                no_photo.append(place_data)
             logger.debug(f"장소 데이터: {place_data}")
             saved_places.append(place_data)   # append로 누적
 
         db.session.commit()
         logger.info("DB 저장 완료")
+
+        # 사진은 커밋 이후 워커가 채움 (photo_pending이면 클라이언트가 GET /places/photos 로 나중에 조회)
+        for place_data in no_photo:
+            gid = place_data["gid"]
+            place_data["photo_pending"] = enqueue_place_photos(gid) or photo_pending(gid)
         return saved_places
 
     except Exception as e:
@@ -526,6 +600,12 @@ def save_places_to_db(url_id, new_places = []):
         logger.error(f"DB 저장 실패: {e}")
         return []
 
+def busy_response(e: BrowserBusyError):
+    """브라우저 대기열 포화 시 429/503 + Retry-After 응답"""
+    response = jsonify({'status': 'error', 'message': str(e), 'retry_after': e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, e.status_code
+
 def extract_shortcode(url):
     pattern = r'/(p|reel|reels|tv)/([^/?#&]+)'
     
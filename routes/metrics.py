@@ -0,0 +1,30 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required
+
+from services.metrics import collect_stats
+from services.my_logger import get_my_logger
+
+bp = Blueprint('metrics', __name__)
+logger = get_my_logger(__name__)
+
+@bp.route("/metrics", methods=["GET"])
+@jwt_required()
+def get_metrics():
+    """
+    서버 내부 통계 조회 (브라우저 대기열 등)
+    ---
+    tags:
+      - Metrics
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: 모듈별 통계 (워커 프로세스 단위)
+        schema:
+          type: object
+          properties:
+            browser:
+              type: object
+              description: 브라우저 풀 / 작업 대기열 상태 (depth, wait_avg, wait_p95, rejected_full 등)
+    """
+    return jsonify(collect_stats()), 200
@@ -3,6 +3,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from models import db, Place, SavedPlace, SavedSeq
 from services.push_notification import notify_place_bookmarked, notify_same_place_saved, is_following
+from services.photo_worker import photo_pending
+from services.utils import get_full_photo_url
 
 user_places_bp = Blueprint("saved_places", __name__)
 
@@ -134,6 +136,66 @@ def _bump_saved_seq(count):
     else:
         db.session.add(SavedSeq(next_val=count))
 
+@user_places_bp.route("/places/photos", methods=["GET"], strict_slashes=False)
+@jwt_required()
+def get_place_photos():
+    """
+    장소 사진 조회 (분석 직후 사진이 비어 있던 장소를 나중에 다시 조회)
+    ---
+    tags:
+      - Saved Places
+    parameters:
+      - name: ids
+        in: query
+        type: string
+        required: true
+        example: "12,34"
+    responses:
+      200:
+        description: 장소별 사진 URL 목록과 수집 진행 여부
+        schema:
+          type: object
+          properties:
+            places:
+              type: array
+              items:
+                type: object
+                properties:
+                  id:
+                    type: integer
+                  photo:
+                    type: array
+                    items:
+                      type: string
+                  photo_pending:
+                    type: boolean
+      400:
+        description: ids 누락
+    """
+    try:
+        place_ids = []
+        for pid in request.args.get("ids", "").split(","):
+            if pid.strip().isdigit():
+                place_ids.append(int(pid))
+        if not place_ids:
+            return jsonify({"error": "No ids provided"}), 400
+
+        places = Place.query.filter(Place.id.in_(place_ids[:50])).all()
+        return jsonify({
+            "places": [
+                {
+                    "id": place.id,
+                    "photo": get_full_photo_url(place.photo),
+                    "photo_pending": not place.photo and photo_pending(place.gid)
+                }
+                for place in places
+            ]
+        }), 200
+
+    except Exception as e:
+        logger.exception("get_place_photos failed")
+        return jsonify({"error": str(e)}), 500
+
 @user_places_bp.route("/places/<int:place_id>/toggle", methods=["POST"], strict_slashes=False)
 @jwt_required()
 def toggle_bookmark(place_id):
@@ -1,94 +1,443 @@
+import os
+import time
+import atexit
 import asyncio
-import threading
 import psutil
 from playwright.async_api import async_playwright
 from services.my_logger import get_my_logger
+from services.loop_runner import background_loop
+from services.browser_queue import BrowserJobQueue, BrowserBusyError, PRIORITY_OCR
+from services.metrics import register_stats
 
 logger = get_my_logger(__name__)
 
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+BROWSER_MAX_USES = int(os.getenv("BROWSER_MAX_USES", "50"))           # n번 쓰면 재시작
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", "600"))      # 메모리 초과 시 재시작
+BROWSER_HEALTH_INTERVAL = int(os.getenv("BROWSER_HEALTH_INTERVAL", "30"))
+BROWSER_JOB_TIMEOUT = int(os.getenv("BROWSER_JOB_TIMEOUT", "60"))
+BROWSER_CONCURRENCY = int(os.getenv("BROWSER_CONCURRENCY", str(BROWSER_POOL_SIZE)))
+BROWSER_REAP_INTERVAL = int(os.getenv("BROWSER_REAP_INTERVAL", "60"))
+BROWSER_CHECKOUT_TIMEOUT = float(os.getenv("BROWSER_CHECKOUT_TIMEOUT", "20"))  # 쉬는 브라우저 대기 상한(초) → 503
+BROWSER_WARM_UP = os.getenv("BROWSER_WARM_UP", "1") == "1"                     # 앱 시작 시 풀 미리 띄우기
+REAP_GRACE_SEC = 30
+
+LAUNCH_ARGS = [
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-translate",
+    "--metrics-recording-only",
+    "--mute-audio",
+    "--js-flags=--max-old-space-size=128",
+]
+
+def _proc_children(pid) -> list:
+    """
+    직계 자식 pid 목록. /proc/<pid>/task/*/children 만 읽으므로 전체 프로세스 테이블을 돌지 않음
+    (psutil.Process.children()은 /proc 전체로 ppid 맵을 만듦)
+    """
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            try:
+                with open(f"/proc/{pid}/task/{tid}/children") as f:
+                    children.extend(int(c) for c in f.read().split())
+            except OSError:
+                pass
+    except OSError:
+        pass
+    return children
+
+def _descendants(pid) -> list:
+    result, stack = [], [pid]
+    while stack:
+        for child in _proc_children(stack.pop()):
+            result.append(child)
+            stack.append(child)
+    return result
+
+def _tree_rss(proc) -> int:
+    total = 0
+    for pid in [proc.pid] + _descendants(proc.pid):
+        try:
+            total += psutil.Process(pid).memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return total
+
+def _kill_tree(proc) -> int:
+    """프로세스 트리 강제 종료, 종료 직전 RSS(byte) 반환"""
+    try:
+        rss = _tree_rss(proc)
+        children = _descendants(proc.pid)
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return 0
+    for pid in children + [proc.pid]:
+        try:
+            psutil.Process(pid).kill()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return rss
+
+async def _browser_pid(browser):
+    """CDP로 chromium 메인(browser) 프로세스 pid 조회. 실패 시 None"""
+    try:
+        cdp = await browser.new_browser_cdp_session()
+        try:
+            info = await asyncio.wait_for(cdp.send("SystemInfo.getProcessInfo"), timeout=5)
+        finally:
+            await cdp.detach()
+        for process in info.get("processInfo", []):
+            if process.get("type") == "browser":
+                return process.get("id")
+    except Exception as e:
+        logger.warning(f"chromium pid 조회 실패: {e}")
+    return None
+
+def _log_warm_up(future):
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error:
+        logger.error(f"브라우저 풀 미리 띄우기 실패 (첫 요청 때 다시 시도): {error}")
+
+class PooledBrowser:
+    def __init__(self, browser, pids):
+        self.browser = browser
+        self.pids = set(pids)       # 이 브라우저의 chromium 메인 프로세스 (보통 1개)
+        self.uses = 0
+        self.launched_at = time.time()
+
+    @property
+    def pid(self):
+        return next(iter(self.pids), None)
+
+    def rss_mb(self) -> float:
+        total = 0
+        for pid in self.pids:
+            try:
+                total += _tree_rss(psutil.Process(pid))
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        return total / (1024 * 1024)
+
+    def kill(self) -> int:
+        killed_rss = 0
+        for pid in self.pids:
+            try:
+                killed_rss += _kill_tree(psutil.Process(pid))
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        return killed_rss
+
 class BrowserManager:
-    def __init__(self):
-        # threading.Semaphore: 이벤트 루프와 무관하게 프로세스 전체에서 동작
-        self._sem = threading.Semaphore(1)
+    """
+    미리 띄워둔 chromium N개를 재사용하는 풀.
+    playwright 객체는 만든 이벤트 루프에 묶이므로 전부 background_loop 위에서만 다룬다.
+    요청 쪽에서는 run(job)으로 job(context)를 넘기고 결과만 받는다.
+    """
+    def __init__(self, pool_size=BROWSER_POOL_SIZE, concurrency=BROWSER_CONCURRENCY):
+        self.pool_size = pool_size
+        self.queue = BrowserJobQueue(concurrency)
+        self._reset_state()
+
+    def _reset_state(self):
+        # 아래는 background_loop 안에서만 접근
+        self._pid = os.getpid()
+        self._playwright = None
+        self._browsers = []
+        self._idle = []
+        self._cond = None
+        self._launch_lock = None
+        self._start_lock = None
+        self._health_task = None
+        self._reap_task = None
+        self._tasks = set()
+
+        # 이 워커가 띄운 chromium 메인 프로세스 {pid: create_time} (pid 재사용 구분용)
+        self._tracked = {}
+        self.reaped_count = 0
+        self.reaped_rss_bytes = 0
+        self.last_reap_at = None
+
+    async def run(self, job, user_id=None, priority=PRIORITY_OCR, **kwargs):
+        """
+        풀의 브라우저에서 새 context를 열어 job(context)를 실행하고 결과 반환.
+        대기열이 가득 차면 BrowserBusyError (라우트에서 429/503으로 변환)
+        """
+        return await background_loop.run(self._run_queued(job, user_id, priority, kwargs))
 
-    async def get_context(self, **kwargs):
-        # 30초 안에 세마포어 못 잡으면 포기 (요청 무한 대기 방지)
-        acquired = await asyncio.to_thread(self._sem.acquire, True, 30)
-        if not acquired:
-            raise RuntimeError("browser busy: acquire timeout")
+    def _check_fork(self):
+        """
+        gunicorn --preload 처럼 풀을 만든 뒤 fork된 워커에서는 부모 루프에 묶인 playwright / lock / condition과
+        부모가 띄운 chromium 기록을 버리고 새로 시작 (LoopRunner가 pid가 바뀌면 루프를 새로 띄우는 것과 같은 방식)
+        """
+        if self._pid == os.getpid():
+            return
+        logger.info(f"[browser pool] fork 감지 (pid {self._pid} → {os.getpid()}), 풀 상태 초기화")
+        self.queue = BrowserJobQueue(self.queue.concurrency)
+        self._reset_state()
 
-        playwright_obj = browser = context = None
+    async def _run_queued(self, job, user_id, priority, context_kwargs):
+        self._check_fork()
+        async with self.queue.slot(user_id, priority):
+            return await self._run_job(job, context_kwargs)
+
+    async def _run_job(self, job, context_kwargs):
+        await self._ensure_started()
+        pooled = await self._checkout()
+        context = None
         try:
-            playwright_obj = await async_playwright().start()
+            context = await asyncio.wait_for(pooled.browser.new_context(**context_kwargs), timeout=15)
+            return await asyncio.wait_for(job(context), timeout=BROWSER_JOB_TIMEOUT)
+        finally:
+            if context:
+                try:
+                    await asyncio.wait_for(context.close(), timeout=5)
+                except Exception as e:
+                    logger.warning(f"context close 실패: {e}")
+            await self._checkin(pooled)
+
+    def warm_up(self):
+        """
+        앱 시작 시 풀을 미리 띄움 (첫 요청이 chromium 실행을 기다리지 않도록). 결과는 기다리지 않음.
+        gunicorn --preload면 마스터 프로세스에도 풀이 뜨므로 BROWSER_WARM_UP=0 권장 (워커는 첫 요청 때 새로 띄움)
+        """
+        if not BROWSER_WARM_UP:
+            return
+        future = background_loop.submit(self._ensure_started())
+        future.add_done_callback(_log_warm_up)
+
+    def _spawn(self, coro):
+        # create_task 결과는 참조를 잡아두지 않으면 GC될 수 있음
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _ensure_started(self):
+        self._check_fork()
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+            self._launch_lock = asyncio.Lock()
+            self._cond = asyncio.Condition()
+
+        async with self._start_lock:
+            if self._playwright:
+                return
+            self._playwright = await async_playwright().start()
+            launched = await asyncio.gather(
+                *[self._launch() for _ in range(self.pool_size)], return_exceptions=True
+            )
+            for pooled in launched:
+                if isinstance(pooled, Exception):
+                    logger.error(f"브라우저 풀 초기 실행 실패: {pooled}")
+                    continue
+                self._browsers.append(pooled)
+                self._idle.append(pooled)
+            if not self._browsers:
+                await self._playwright.stop()
+                self._playwright = None
+                raise RuntimeError("browser pool: 브라우저를 하나도 띄우지 못함")
+
+            self._health_task = self._spawn(self._health_loop())
+            self._reap_task = self._spawn(self._reap_loop())
+            logger.info(f"브라우저 풀 준비 완료: {len(self._browsers)}/{self.pool_size}")
+
+    async def _launch(self) -> PooledBrowser:
+        async with self._launch_lock:
             browser = await asyncio.wait_for(
-                playwright_obj.chromium.launch(
-                    headless=True,
-                    args=[
-                        "--no-sandbox",
-                        "--disable-setuid-sandbox",
-                        "--disable-dev-shm-usage",
-                        "--disable-gpu",
-                        "--disable-extensions",
-                        "--disable-background-networking",
-                        "--disable-default-apps",
-                        "--disable-sync",
-                        "--disable-translate",
-                        "--metrics-recording-only",
-                        "--mute-audio",
-                        "--js-flags=--max-old-space-size=128",
-                    ],
-                ),
+                self._playwright.chromium.launch(headless=True, args=LAUNCH_ARGS),
                 timeout=15,
             )
-            context = await asyncio.wait_for(browser.new_context(**kwargs), timeout=15)
-            return playwright_obj, browser, context
-        except Exception:
+            # 직접 띄운 브라우저의 pid만 기록 → reaper는 이 pid만 정리 (browser_service 등 다른 chromium은 건드리지 않음)
+            pid = await _browser_pid(browser)
+            pids = set()
+            if pid:
+                try:
+                    self._tracked[pid] = psutil.Process(pid).create_time()
+                    pids.add(pid)
+                except psutil.NoSuchProcess:
+                    pass
+            else:
+                logger.warning("새 chromium pid를 알 수 없어 고아 정리 대상에서 제외")
+        return PooledBrowser(browser, pids)
+
+    async def _checkout(self) -> PooledBrowser:
+        # 재실행이 계속 실패하면 쉬는 브라우저가 안 생기므로 무한정 기다리지 않음
+        async with self._cond:
             try:
-                await self._cleanup(playwright_obj, browser, context)
-            finally:
-                await asyncio.to_thread(self._sweep_orphan_chromium)
-                self._sem.release()
-            raise
-
-    async def _cleanup(self, playwright_obj, browser, context):
-        if context:
+                await asyncio.wait_for(self._cond.wait_for(lambda: self._idle), timeout=BROWSER_CHECKOUT_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"[pool] {BROWSER_CHECKOUT_TIMEOUT:.0f}초 동안 쉬는 브라우저 없음 (browsers={len(self._browsers)})")
+                raise BrowserBusyError("서버가 혼잡합니다. 잠시 후 다시 시도해주세요.", 503, BROWSER_CHECKOUT_TIMEOUT)
+            return self._idle.pop()
+
+    async def _checkin(self, pooled: PooledBrowser):
+        pooled.uses += 1
+        reason = await self._recycle_reason(pooled)
+        if reason:
+            logger.info(f"브라우저 재시작 (pid={pooled.pid}, uses={pooled.uses}): {reason}")
+            self._spawn(self._replace(pooled))
+            return
+        async with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    async def _recycle_reason(self, pooled: PooledBrowser):
+        if not pooled.browser.is_connected():
+            return "연결 끊김"
+        if pooled.uses >= BROWSER_MAX_USES:
+            return "사용 횟수 초과"
+        rss = await asyncio.to_thread(pooled.rss_mb)
+        if rss > BROWSER_MAX_RSS_MB:
+            return f"메모리 초과 ({rss:.0f}MB)"
+        return None
+
+    async def _replace(self, pooled: PooledBrowser):
+        if pooled in self._browsers:
+            self._browsers.remove(pooled)
+        await self._close_browser(pooled)
+
+        delay = 1
+        while self._playwright:
             try:
-                await asyncio.wait_for(context.close(), timeout=5)
+                new = await self._launch()
+                break
             except Exception as e:
-                logger.warning(f"context close 실패: {e}")
+                logger.error(f"브라우저 재실행 실패, {delay}초 후 재시도: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+        else:
+            return
+
+        async with self._cond:
+            self._browsers.append(new)
+            self._idle.append(new)
+            self._cond.notify()
+
+    async def _close_browser(self, pooled: PooledBrowser):
+        try:
+            await asyncio.wait_for(pooled.browser.close(), timeout=8)
+        except Exception as e:
+            # 여기서 못 죽인 건 _tracked에 남아서 다음 reap 때 정리됨
+            logger.warning(f"browser close 실패, 프로세스 강제 종료 (pid={pooled.pid}): {e}")
+            await asyncio.to_thread(pooled.kill)
+
+    def _active_pids(self) -> set:
+        pids = set()
+        for pooled in self._browsers:
+            pids |= pooled.pids
+        return pids
 
-        if browser:
+    def _reap_orphans(self, active_pids: set, grace: float = REAP_GRACE_SEC) -> int:
+        """
+        이 워커가 launch 때 기록한 chromium 중 풀에 없는 것만 정리 (드라이버가 죽어 init으로 넘어간 프로세스 포함).
+        기록한 pid만 보므로 같은 호스트의 다른 워커나 browser_service의 chromium은 건드리지 않음
+        """
+        orphans = {}
+        now = time.time()
+        for pid, create_time in list(self._tracked.items()):
+            # 막 띄워서 아직 풀에 넣기 전인 브라우저는 제외
+            if pid in active_pids or now - create_time < grace:
+                continue
             try:
-                await asyncio.wait_for(browser.close(), timeout=8)
+                proc = psutil.Process(pid)
+                if proc.create_time() != create_time:
+                    raise psutil.NoSuchProcess(pid)
+                orphans[pid] = proc
+            except psutil.NoSuchProcess:
+                del self._tracked[pid]
+            except psutil.AccessDenied:
+                pass
+
+        reaped = 0
+        for pid, proc in orphans.items():
+            rss = _kill_tree(proc)
+            self._tracked.pop(pid, None)
+            self.reaped_count += 1
+            self.reaped_rss_bytes += rss
+            reaped += 1
+            logger.warning(f"고아 chromium 정리 (pid={pid}, rss={rss / (1024 * 1024):.0f}MB)")
+        self.last_reap_at = time.time()
+        return reaped
+
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(BROWSER_REAP_INTERVAL)
+            try:
+                # launch 중인 브라우저를 고아로 오인하지 않도록 launch와 겹치지 않게
+                async with self._launch_lock:
+                    await asyncio.to_thread(self._reap_orphans, self._active_pids())
             except Exception as e:
-                logger.warning(f"browser close 실패 (release의 스윕이 정리함): {e}")
+                logger.error(f"[reaper] 고아 chromium 정리 에러: {e}")
 
-        if playwright_obj:
+    async def _health_loop(self):
+        """쉬고 있는 브라우저만 주기적으로 검사 (연결 상태, 메모리)"""
+        while True:
+            await asyncio.sleep(BROWSER_HEALTH_INTERVAL)
             try:
-                await asyncio.wait_for(playwright_obj.stop(), timeout=5)
+                async with self._cond:
+                    idle, self._idle = self._idle, []
+
+                healthy = []
+                for pooled in idle:
+                    reason = await self._recycle_reason(pooled)
+                    if reason:
+                        logger.info(f"[health] 브라우저 교체 (pid={pooled.pid}): {reason}")
+                        self._spawn(self._replace(pooled))
+                    else:
+                        healthy.append(pooled)
+
+                async with self._cond:
+                    self._idle.extend(healthy)
+                    self._cond.notify(len(healthy))
             except Exception as e:
-                logger.warning(f"playwright stop 실패: {e}")
-                
-    def _sweep_orphan_chromium(self):
-        """release 시점에 남아있는 chromium/드라이버는 전부 고아 → 강제 정리"""
-        killed = 0
-        for proc in psutil.process_iter(['pid', 'cmdline']):
+                logger.error(f"[health] 브라우저 검사 에러: {e}")
+
+    async def _shutdown(self):
+        for task in (self._health_task, self._reap_task):
+            if task:
+                task.cancel()
+        for pooled in list(self._browsers):
+            await self._close_browser(pooled)
+        self._browsers, self._idle = [], []
+        if self._playwright:
             try:
-                cmd = ' '.join(proc.info['cmdline'] or [])
-                if 'chrome-headless-shell' in cmd or 'headless_shell' in cmd:
-                    proc.kill()
-                    killed += 1
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                pass
-        if killed:
-            logger.warning(f"고아 chromium {killed}개 강제 정리")
+                await asyncio.wait_for(self._playwright.stop(), timeout=5)
+            except Exception as e:
+                logger.warning(f"playwright stop 실패: {e}")
+            self._playwright = None
 
-    async def release(self, playwright_obj, browser, context):
+    def close(self):
+        # fork된 워커의 atexit에서 부모가 띄운 브라우저를 닫거나 정리하지 않도록
+        if not self._playwright or self._pid != os.getpid():
+            return
         try:
-            # 기존 cleanup (context.close → browser.close → playwright.stop)
-            await self._cleanup(playwright_obj, browser, context)
+            background_loop.run_sync(self._shutdown(), timeout=20)
+        except Exception as e:
+            logger.warning(f"브라우저 풀 종료 실패: {e}")
         finally:
-            # cleanup 성공 여부와 무관하게 잔존 프로세스 스윕
-            await asyncio.to_thread(self._sweep_orphan_chromium)
-            self._sem.release()
-global_browser_manager = BrowserManager()
\ No newline at end of file
+            self._reap_orphans(active_pids=set(), grace=0)
+
+    def stats(self) -> dict:
+        return {
+            "pool_size": self.pool_size,
+            "browsers": len(self._browsers),
+            "idle": len(self._idle),
+            "tracked_processes": len(self._tracked),
+            "reaped_count": self.reaped_count,
+            "reaped_rss_mb": round(self.reaped_rss_bytes / (1024 * 1024), 1),
+            "last_reap_at": self.last_reap_at,
+            "queue": self.queue.stats(),
+        }
+
+global_browser_manager = BrowserManager()
+atexit.register(global_browser_manager.close)
+register_stats("browser", global_browser_manager.stats)
@@ -0,0 +1,183 @@
+import os
+import time
+import math
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from services.my_logger import get_my_logger
+
+logger = get_my_logger(__name__)
+
+# 숫자가 작을수록 먼저 실행
+PRIORITY_PROBE = 0   # eligibility: 캡션, 캐러셀 개수 확인
+PRIORITY_OCR = 1     # analyze: 이미지 URL 추출(OCR)
+
+BROWSER_QUEUE_MAX = int(os.getenv("BROWSER_QUEUE_MAX", "20"))                  # 전체 대기열 한도 → 503
+BROWSER_QUEUE_MAX_PER_USER = int(os.getenv("BROWSER_QUEUE_MAX_PER_USER", "2"))  # 유저별 대기 한도 → 429
+BROWSER_QUEUE_MAX_WAIT = float(os.getenv("BROWSER_QUEUE_MAX_WAIT", "30"))       # 예상/실제 대기 상한(초) → 503
+
+class BrowserBusyError(Exception):
+    """대기열이 가득 차서 요청을 받지 않음. 라우트에서 status_code / Retry-After로 응답"""
+    def __init__(self, message, status_code=503, retry_after=5):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+class _Waiter:
+    def __init__(self, user_key, priority, future):
+        self.user_key = user_key
+        self.priority = priority
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+class BrowserJobQueue:
+    """
+    브라우저 작업 대기열 (background_loop 안에서만 사용).
+    - 동시 실행 수 제한
+    - 우선순위별 대기열, 같은 우선순위 안에서는 유저 단위 라운드로빈 (한 유저가 독점 못하게)
+    - 대기열/예상 대기시간 초과 시 바로 거절 (429/503 + retry_after)
+    """
+    def __init__(self, concurrency):
+        self.concurrency = max(1, concurrency)
+        self.running = 0
+        # priority -> OrderedDict(user_key -> deque[_Waiter])
+        self._queues = {}
+
+        # 통계
+        self.admitted = 0
+        self.rejected_user = 0
+        self.rejected_full = 0
+        self.timed_out = 0
+        self.max_wait = 0.0
+        self._wait_samples = deque(maxlen=200)
+        self._avg_job_time = 5.0  # EWMA, 초기값은 보수적으로
+
+    def depth(self, max_priority=None) -> int:
+        total = 0
+        for priority, users in self._queues.items():
+            if max_priority is not None and priority > max_priority:
+                continue
+            total += sum(len(q) for q in users.values())
+        return total
+
+    def _user_depth(self, user_key) -> int:
+        return sum(len(users.get(user_key, ())) for users in self._queues.values())
+
+    def estimate_wait(self, priority) -> float:
+        ahead = self.depth(max_priority=priority)
+        if self.running < self.concurrency and ahead == 0:
+            return 0.0
+        return (ahead + 1) / self.concurrency * self._avg_job_time
+
+    @asynccontextmanager
+    async def slot(self, user_id=None, priority=PRIORITY_OCR):
+        await self._acquire(user_id, priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._avg_job_time = self._avg_job_time * 0.8 + elapsed * 0.2
+            self._release()
+
+    async def _acquire(self, user_id, priority):
+        user_key = str(user_id) if user_id is not None else "anonymous"
+
+        if self.running < self.concurrency and self.depth() == 0:
+            self.running += 1
+            self._record_wait(0.0)
+            return
+
+        estimated = self.estimate_wait(priority)
+        if user_id is not None and self._user_depth(user_key) >= BROWSER_QUEUE_MAX_PER_USER:
+            self.rejected_user += 1
+            raise BrowserBusyError("이미 진행 중인 추출이 있습니다. 잠시 후 다시 시도해주세요.", 429, estimated)
+        if self.depth() >= BROWSER_QUEUE_MAX or estimated > BROWSER_QUEUE_MAX_WAIT:
+            self.rejected_full += 1
+            logger.warning(f"[queue] 요청 거절 - depth={self.depth()}, 예상 대기={estimated:.1f}s")
+            raise BrowserBusyError("서버가 혼잡합니다. 잠시 후 다시 시도해주세요.", 503, estimated)
+
+        waiter = _Waiter(user_key, priority, asyncio.get_running_loop().create_future())
+        users = self._queues.setdefault(priority, OrderedDict())
+        users.setdefault(user_key, deque()).append(waiter)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=BROWSER_QUEUE_MAX_WAIT)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 슬롯을 받은 직후 취소됨 → 슬롯 반납
+                self._release()
+            else:
+                waiter.future.cancel()
+                self._remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise BrowserBusyError("대기 시간이 초과되었습니다. 잠시 후 다시 시도해주세요.", 503,
+                                       self.estimate_wait(priority))
+            raise
+
+        self._record_wait(time.monotonic() - waiter.enqueued_at)
+
+    def _remove(self, waiter):
+        users = self._queues.get(waiter.priority)
+        if not users or waiter.user_key not in users:
+            return
+        q = users[waiter.user_key]
+        try:
+            q.remove(waiter)
+        except ValueError:
+            pass
+        if not q:
+            del users[waiter.user_key]
+
+    def _release(self):
+        self.running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.running < self.concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            if waiter.future.done():
+                continue
+            self.running += 1
+            waiter.future.set_result(True)
+
+    def _next_waiter(self):
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            if not users:
+                continue
+            # 맨 앞 유저의 첫 작업을 꺼내고, 남은 게 있으면 그 유저를 맨 뒤로 (라운드로빈)
+            user_key, q = next(iter(users.items()))
+            waiter = q.popleft()
+            del users[user_key]
+            if q:
+                users[user_key] = q
+            return waiter
+        return None
+
+    def _record_wait(self, waited):
+        self.admitted += 1
+        self.max_wait = max(self.max_wait, waited)
+        self._wait_samples.append(waited)
+
+    def stats(self) -> dict:
+        samples = sorted(self._wait_samples)
+        p95 = samples[int(len(samples) * 0.95) - 1] if samples else 0.0
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "depth": self.depth(),
+            "depth_by_priority": {str(p): sum(len(q) for q in users.values())
+                                  for p, users in self._queues.items()},
+            "admitted": self.admitted,
+            "rejected_user": self.rejected_user,
+            "rejected_full": self.rejected_full,
+            "timed_out": self.timed_out,
+            "wait_avg": round(sum(samples) / len(samples), 3) if samples else 0.0,
+            "wait_p95": round(p95, 3),
+            "wait_max": round(self.max_wait, 3),
+            "avg_job_time": round(self._avg_job_time, 3),
+        }
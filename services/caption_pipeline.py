@@ -0,0 +1,168 @@
+import os
+import re
+import json
+import time
+import threading
+from services.my_logger import get_my_logger
+from services.metrics import register_stats
+
+logger = get_my_logger(__name__)
+
+# 1이면 관측된 성공률 순으로 전략 순서를 바꿈.
+# 성공률이 높다고 캡션이 더 온전한 건 아니라서(og:description은 잘릴 수 있음) 기본은 고정 순서
+CAPTION_PIPELINE_ADAPTIVE = os.getenv("CAPTION_PIPELINE_ADAPTIVE", "0") == "1"
+CAPTION_PIPELINE_MIN_SAMPLES = int(os.getenv("CAPTION_PIPELINE_MIN_SAMPLES", "50"))
+SHORTCODE_WINDOW = 3000
+
+# 정규식은 import 시점에 한 번만 컴파일
+POST_CAPTION_PATTERNS = [
+    re.compile(r'"edge_media_to_caption"\s*:\s*\{\s*"edges"\s*:\s*\[\s*\{\s*"node"\s*:\s*\{\s*"text"\s*:\s*"([^"]+)"'),
+    re.compile(r'"caption"\s*:\s*\{\s*"text"\s*:\s*"([^"]+)"'),
+]
+REEL_CAPTION_PATTERNS = [
+    re.compile(r'"clips_metadata"\s*:\s*\{.*?"caption"\s*:\s*"([^"]+)"'),
+]
+
+class PageData:
+    """전략들이 공유하는 입력. shortcode 주변 윈도우는 처음 필요할 때 한 번만 계산"""
+    def __init__(self, raw: dict, shortcode: str):
+        self.raw = raw
+        self.shortcode = shortcode
+        self._window = None
+
+    @property
+    def window(self) -> str:
+        if self._window is None:
+            self._window = _shortcode_window(self.raw.get("html", ""), self.shortcode)
+        return self._window
+
+def _shortcode_window(content: str, shortcode: str) -> str:
+    """전체 페이지가 아니라, 해당 shortcode 주변 블록만 잘라냄"""
+    if not shortcode or not content:
+        return ""
+
+    sc_match = re.search(r'"shortcode"\s*:\s*"' + re.escape(shortcode) + r'"', content)
+    if not sc_match:
+        logger.debug(f"[DEBUG] 페이지 내 shortcode({shortcode}) 위치를 못 찾음")
+        return ""
+
+    # shortcode 위치 기준 앞뒤 3000자 윈도우만 탐색
+    start = max(0, sc_match.start() - SHORTCODE_WINDOW)
+    end = min(len(content), sc_match.end() + SHORTCODE_WINDOW)
+    return content[start:end]
+
+def _search_window(window: str, patterns: list) -> str:
+    for pattern in patterns:
+        match = pattern.search(window)
+        if match:
+            return json.loads(f'"{match.group(1)}"')
+    return ""
+
+# 전략: PageData -> 캡션 문자열 (없으면 "")
+def json_ld_caption(page: PageData) -> str:
+    ld_json = page.raw.get("ld_json")
+    if not ld_json:
+        return ""
+    data = json.loads(ld_json[0])
+    return data.get("caption") or data.get("articleBody") or ""
+
+def post_regex_caption(page: PageData) -> str:
+    return _search_window(page.window, POST_CAPTION_PATTERNS)
+
+def og_description_caption(page: PageData) -> str:
+    meta_desc = page.raw.get("meta", {}).get("og:description")
+    if not meta_desc:
+        return ""
+    if ": \"" in meta_desc:
+        return meta_desc.split(": \"", 1)[1].rsplit("\"", 1)[0]
+    if ": “" in meta_desc:
+        return meta_desc.split(": “", 1)[1].rsplit("”", 1)[0]
+    return meta_desc
+
+def ui_element_caption(page: PageData) -> str:
+    return page.raw.get("ui_text") or ""
+
+def reel_regex_caption(page: PageData) -> str:
+    return _search_window(page.window, REEL_CAPTION_PATTERNS)
+
+class CaptionStrategy:
+    def __init__(self, step, func):
+        self.step = step
+        self.func = func
+        self.attempts = 0
+        self.hits = 0
+        self.total_time = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.attempts if self.attempts else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "attempts": self.attempts,
+            "hits": self.hits,
+            "hit_rate": round(self.hit_rate, 3),
+            "avg_ms": round(self.total_time / self.attempts * 1000, 2) if self.attempts else 0.0,
+        }
+
+class CaptionPipeline:
+    """등록 순서대로 전략을 돌려 처음 성공한 캡션 반환. 전략별 성공률/지연 시간 기록"""
+    def __init__(self, adaptive=CAPTION_PIPELINE_ADAPTIVE, min_samples=CAPTION_PIPELINE_MIN_SAMPLES):
+        self.strategies = []
+        self.adaptive = adaptive
+        self.min_samples = min_samples
+        self.runs = 0
+        self._lock = threading.Lock()
+
+    def register(self, step, func):
+        self.strategies.append(CaptionStrategy(step, func))
+
+    def ordered(self) -> list:
+        if not self.adaptive or self.runs < self.min_samples:
+            return list(self.strategies)
+        # 성공률 높은 순, 같으면 원래 순서 유지 (sorted는 안정 정렬)
+        return sorted(self.strategies, key=lambda s: -s.hit_rate)
+
+    def run(self, raw: dict, shortcode: str):
+        """(캡션, 성공 단계) 반환, 실패 시 ("", "failed")"""
+        page = PageData(raw, shortcode)
+        with self._lock:
+            self.runs += 1
+
+        for strategy in self.ordered():
+            start = time.perf_counter()
+            try:
+                caption_text = strategy.func(page)
+            except Exception as e:
+                logger.debug(f"[caption] {strategy.step} 에러: {e}")
+                caption_text = ""
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                strategy.attempts += 1
+                strategy.total_time += elapsed
+                if caption_text:
+                    strategy.hits += 1
+
+            if caption_text:
+                return caption_text, strategy.step
+        return "", "failed"
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "adaptive": self.adaptive,
+            "order": [s.step for s in self.ordered()],
+            "strategies": {s.step: s.stats() for s in self.strategies},
+        }
+
+caption_pipeline = CaptionPipeline()
+# 일반 포스트
+caption_pipeline.register("1-1 (JSON-LD)", json_ld_caption)
+caption_pipeline.register("1-2 (Regex, scoped)", post_regex_caption)
+# 릴스
+caption_pipeline.register("2-1 (Reels Logic)", og_description_caption)
+caption_pipeline.register("2-2 (Reels UI element)", ui_element_caption)
+caption_pipeline.register("2-3 (Reels Regex, scoped)", reel_regex_caption)
+
+register_stats("caption_pipeline", caption_pipeline.stats)
@@ -1,30 +1,39 @@
 import os
 import re
-import requests
-import time
 import uuid
 from typing import List, Dict, Optional, Tuple
 from urllib.parse import quote_plus
+from concurrent.futures import ThreadPoolExecutor
 import geopandas as gpd
-import boto3
 
 from models import db, Place, InstaUrl, UrlPlace
 from services.my_logger import get_my_logger
 from services.utils import get_full_photo_url
+from services.rate_limiter import TokenBucket
+from services.provider_cache import cached_lookup
+from services.metrics import register_stats
+from services import provider_http
+from services.photo_store import store_google_photo
 
 logger = get_my_logger(__name__)
-s3 = boto3.client('s3')
 
 SEARCH_CLIENT_ID = os.getenv("NAVER_CLIENT_ID")
 SEARCH_CLIENT_SECRET = os.getenv("NAVER_CLIENT_SECRET")
 PLACE_API_KEY = os.getenv("PLACE_API_KEY")
-BUCKET_NAME = os.getenv("BUCKET_NAME")
 
 # 구글 API 엔드포인트
 GOOGLE_TEXTSEARCH_URL = "https://maps.googleapis.com/maps/api/place/textsearch/json"
 GOOGLE_PHOTO_URL = "https://maps.googleapis.com/maps/api/place/photo"
 
-session = requests.Session()
+# 후보별 외부 API 호출용 스레드 풀 / 제공자별 초당 요청 수 제한 (고정 sleep 대신)
+PLACE_RESOLVE_WORKERS = int(os.getenv("PLACE_RESOLVE_WORKERS", "8"))
+NAVER_RPS = float(os.getenv("NAVER_RPS", "10"))
+GOOGLE_RPS = float(os.getenv("GOOGLE_RPS", "20"))
+
+_resolver = ThreadPoolExecutor(max_workers=PLACE_RESOLVE_WORKERS, thread_name_prefix="place-resolver")
+naver_limiter = TokenBucket(NAVER_RPS)
+google_limiter = TokenBucket(GOOGLE_RPS)
+register_stats("place_rate_limit", lambda: {"naver": naver_limiter.stats(), "google": google_limiter.stats()})
 
 # enum('restaurant','bar','cafe','dessert','exhibition','prop_shop','experience','clothing','etc') 
 def _map_google_category(google_types: list) -> str:
@@ -67,30 +76,22 @@ def _map_google_category(google_types: list) -> str:
     logger.debug(f"분류: {result_category}, 구글 카테고리: {types_set}")
 
     return result_category
-def _download_google_photo(shortcut, photo_reference: str) -> Optional[str]:
-    """구글 포토 Reference로 이미지 다운로드 및 저장"""
+def download_google_photo(photo_reference: str) -> Optional[str]:
+    """구글 포토 Reference로 이미지 다운로드 및 저장 (이미 저장된 사진이면 기존 경로 재사용)"""
     if not PLACE_API_KEY: return None
 
-    try:
+    def download():
         params = {
             "maxwidth": 400,
             "photo_reference": photo_reference,
             "key": PLACE_API_KEY
         }
-        r = requests.get(GOOGLE_PHOTO_URL, params=params, timeout=20)
+        r = provider_http.get(GOOGLE_PHOTO_URL, params=params, timeout=(provider_http.PROVIDER_CONNECT_TIMEOUT, 20), limiter=google_limiter)
         r.raise_for_status()
+        return r.content
 
-        filename = f"{shortcut}_{uuid.uuid4()}.jpg"
-        s3_key = f"places/{filename}" 
-
-        s3.put_object(
-        Bucket=BUCKET_NAME,
-        Key=s3_key,
-        Body=r.content,
-        ContentType='image/jpeg' # 브라우저에서 바로 보이도록 설정
-    )
-        return f"/{s3_key}" # f"https://{BUCKET_NAME}.s3.ap-northeast-2.amazonaws.com/{s3_key}"
-    
+    try:
+        return store_google_photo(photo_reference, download)
     except Exception as e:
         print(f"[Photo Download Error] {e}")
         return None
@@ -125,19 +126,58 @@ def _search_naver_local(list_query: list) -> dict: # 쿼리 ex) 서울(성수) 
         "X-Naver-Client-Secret": SEARCH_CLIENT_SECRET
     }
     try:
-        r = requests.get(url, headers=headers, timeout=5)
-        if r.status_code == 200:
-            data = r.json()
-            if data.get("items"):
-                return data["items"][0]
-
+        return cached_lookup("naver_local", query, lambda: _naver_local_request(url, headers))
     except Exception:
         pass
     return {}
 
-def _fetch_google_details(name: str, address: str, shortcut) -> dict:
+def _naver_local_request(url, headers) -> dict:
+    r = provider_http.get(url, headers=headers, limiter=naver_limiter)
+    r.raise_for_status() # 200이 아니면 캐시하지 않음
+    data = r.json()
+    if data.get("items"):
+        return data["items"][0]
+    return {}
+
+def _google_textsearch(params) -> dict:
+    """가장 관련도 높은 검색 결과 1건. 결과 없음은 {}, 그 외 상태(쿼터 초과 등)는 예외"""
+    r = provider_http.get(GOOGLE_TEXTSEARCH_URL, params=params, limiter=google_limiter)
+    data = r.json()
+
+    status = data.get("status")
+    if status == "ZERO_RESULTS":
+        return {}
+    if status != "OK":
+        raise RuntimeError(status)
+    return data["results"][0] if data.get("results") else {}
+
+def _google_details_photos(place_id) -> list:
+    details_url = "https://maps.googleapis.com/maps/api/place/details/json"
+    details_params = {
+        "place_id": place_id,
+        "fields": "photos",
+        "key": PLACE_API_KEY,
+        "language": "ko"
+    }
+    res = provider_http.get(details_url, params=details_params, limiter=google_limiter)
+    details_data = res.json()
+
+    status = details_data.get("status")
+    if status in ("NOT_FOUND", "ZERO_RESULTS"):
+        return []
+    if status != "OK":
+        raise RuntimeError(status)
+    return details_data.get("result", {}).get("photos", [])
+
+def get_google_photo_refs(place_id, limit=4) -> list:
+    """장소의 구글 사진 reference 목록 (앞에서부터 limit장)"""
+    photo_list = cached_lookup("google_details", place_id, lambda: _google_details_photos(place_id))
+    return [p["photo_reference"] for p in photo_list if p.get("photo_reference")][:limit]
+
+def _fetch_google_details(name: str, address: str) -> dict:
     """
-    구글 검색으로 모든 정보(좌표, 카테고리, 평점, 리뷰수, 사진) 가져오기
+    구글 검색으로 정보(좌표, 카테고리, 평점, 리뷰수) 가져오기.
+    사진은 응답을 늦추지 않도록 장소 저장 후 photo_worker가 채움
     """
     if not PLACE_API_KEY:
         print("not google api key")
@@ -162,23 +202,21 @@ def _fetch_google_details(name: str, address: str, shortcut) -> dict:
             "category": "etc",
             "rating_avg": 0.0,
             "rating_count": 0,
-            "photos": []      # 썸네일만
+            "photos": ""      # photo_worker가 나중에 채움
         }
 
     try:
-        r = requests.get(GOOGLE_TEXTSEARCH_URL, params=params, timeout=5)
-        data = r.json()
+        best = cached_lookup("google_textsearch", query, lambda: _google_textsearch(params))
+    except Exception as e:
+        print(f"구글 검색 결과 없음/에러 ({name}): {e}")
+        return {}
+    if not best:
+        print(f"구글 검색 결과 없음/에러 ({name}): ZERO_RESULTS")
+        return {}
 
-        status = data.get("status")
-        if status != "OK":
-            print(f"구글 검색 결과 없음/에러 ({name}): {status}")
-            return {}
-            
-        if data.get("status") == "OK" and data.get("results"):
-            best = data["results"][0]
+    try:
+        if best:
             
-            # 애초에 검색할 때 한번에 
-            place_id = best.get("place_id", "")
             # 주소
             result_data["gid"] = best.get("place_id", "")
             result_data["name"] = best.get("name", name)
@@ -197,36 +235,6 @@ def _fetch_google_details(name: str, address: str, shortcut) -> dict:
             result_data["rating_avg"] = float(best.get("rating", 0.0))
             result_data["rating_count"] = int(best.get("user_ratings_total", 0))
 
-            # 사진 다운로드 (썸네일만)
-            saved_paths = []
-            photo_list = []
-            if place_id:
-                details_url = "https://maps.googleapis.com/maps/api/place/details/json"
-                details_params = {
-                    "place_id": place_id,
-                    "fields": "photos", 
-                    "key": PLACE_API_KEY,
-                    "language": "ko"
-                }
-                try:
-                    res = requests.get(details_url, params=details_params, timeout=5)
-                    details_data = res.json()
-                    if details_data.get("status") == "OK":
-                        photo_list = details_data.get("result", {}).get("photos", [])
-                except Exception as e:
-                    logger.error(f"[Google Details Photo Error]: {e}")
-
-            # 사진 다운로드
-            saved_paths = []
-            for photo in photo_list[:4]: # 앞에서부터 4장만 슬라이싱
-                ref = photo.get("photo_reference")
-                if ref:
-                    path = _download_google_photo(shortcut, ref)
-                    if path:
-                        saved_paths.append(path)
-            
-            result_data["photos"] = ",".join(saved_paths) # 4장 경로. 나중에 photo.split(",")
-            
     except Exception as e:
         logger.error(f"❌ [Google Details Error 상세]: {type(e).__name__} - {e}")
 
@@ -259,117 +267,111 @@ def trans_geo(road_mapx, road_mapy) -> Tuple[float, float]:
         logger.error(f"trans_geo 변환 중 오류 발생: {e}")
         return 0.0, 0.0
 
+def _place_to_dict(place) -> dict:
+    return {
+        "name": place.name,
+        "address": place.address,
+        "category": place.category,
+        "latitude": place.latitude,
+        "longitude": place.longitude,
+        "rating_avg": place.rating_avg,
+        "rating_count": place.rating_count,
+        "gid": place.gid,
+        "photo": get_full_photo_url(place.photo)
+    }
+
+def _naver_step(query) -> dict:
+    """네이버 검색 + 좌표 변환 (스레드 풀에서 실행, DB 접근 없음)"""
+    logger.debug(f"\n[Processing] {query}...")
+    orig_name = query[0]
+    orig_addr = query[1] if len(query) > 1 else ""
+
+    step = {"name": orig_name, "address": orig_addr, "lat": 0.0, "lng": 0.0, "naver_success": False}
+    naver_item = _search_naver_local([orig_name, orig_addr])
+    if naver_item:
+        # 네이버 데이터 정제
+        step["name"] = re.sub(r'<[^>]+>', '', naver_item['title'])
+        step["address"] = naver_item.get('roadAddress') or naver_item.get('address')
+        road_mapx = naver_item.get('mapx')
+        road_mapy = naver_item.get('mapy')
+
+        logger.debug(f"x: {road_mapx} y: {road_mapy}")
+        if road_mapx and road_mapy:
+            step["naver_success"] = True
+            # 위경도 변환 (경도, 위도 순서로 받음)
+            step["lng"], step["lat"] = trans_geo(road_mapx, road_mapy)
+    else:
+        logger.debug(f"[네이버 검색 실패] 가게명: {orig_name}, 주소: {orig_addr}")
+        # 검색 결과 없으면 이름 바로 구글 검색
+    return step
+
 def process_places(place_queries: list[str], shortcut) -> list[dict]: # [[name, address], [name, address]...]
     """
-    입력된 장소명 리스트를 받아 네이버 검증 -> 구글 상세정보 병합 후 최종 데이터 반환
+    입력된 장소명 리스트를 받아 네이버 검증 -> 구글 상세정보 병합 후 최종 데이터 반환.
+    외부 API 호출은 후보별로 스레드 풀에서 동시에, DB 조회는 호출한 스레드에서만 (입력 순서 유지)
     """
-    final_results = []
-    
-    for idx, query in enumerate(place_queries):
-        logger.debug(f"\n[Processing] {query}...")
-        orig_name = query[0]
-        orig_addr = query[1] if len(query) > 1 else ""
-        
-        # 네이버 검색해서 없으면 그냥 버리기
-        # 네이버 검색
-        if idx%5 == 0: time.sleep(0.3)
-
-        naver_success = False
-        road_name, road_addr = orig_name, orig_addr
-        lat, lng = 0.0, 0.0
-        naver_item = _search_naver_local([orig_name, orig_addr])
-        if naver_item :
-            # 네이버 데이터 정제
-            road_name = re.sub(r'<[^>]+>', '', naver_item['title'])
-            road_addr = naver_item.get('roadAddress') or naver_item.get('address')
-            road_mapx = naver_item.get('mapx') 
-            road_mapy = naver_item.get('mapy') 
-
-            logger.debug(f"x: {road_mapx} y: {road_mapy}")
-            # DB 확인(위,경도값으로 place 내부 돌기)
-            # DB 있으니 다른 장소로 넘어가기
-            if road_mapx and road_mapy:
-                naver_success = True
-                # 위경도 변환 (경도, 위도 순서로 받음)
-                lng, lat = trans_geo(road_mapx, road_mapy)
-            
-                place = db.session.query(Place).filter(
-                    Place.latitude == lat, Place.longitude == lng
-                ).first()
-
-                if place:
-                    logger.debug(f"[DB Hit] 기존 장소 발견 (Naver 위경도): {place.name}")
-                    place_data = {       
-                    "name": place.name,
-                    "address": place.address,
-                    "category": place.category, 
-                    "latitude": place.latitude,
-                    "longitude": place.longitude,
-                    "rating_avg": place.rating_avg,
-                    "rating_count": place.rating_count,
-                    "gid": place.gid,
-                    "photo": get_full_photo_url(place.photo)
-                    }   
-                    final_results.append(place_data)
-                    continue
-        else:
-            logger.debug(f"[네이버 검색 실패] 가게명: {road_name}, 주소: {road_addr}")
-            # 검색 결과 없으면 이름 바로 구글 검색
-    
-        # 2. 구글 통합 검색 (좌표, 카테고리, 평점, 리뷰, 사진) 
-        google_data = _fetch_google_details(road_name, road_addr, shortcut) # 주소 없어도 되나?
-        
-        gid =  google_data.get("gid")
-        if gid: 
+    # 1. 네이버 검색 (전체 후보 동시)
+    steps = list(_resolver.map(_naver_step, place_queries))
+    results = [None] * len(steps)
+
+    # DB 확인(위,경도값으로 place 내부 돌기). DB 있으니 다른 장소로 넘어가기
+    need_google = []
+    for idx, step in enumerate(steps):
+        if step["naver_success"]:
+            place = db.session.query(Place).filter(
+                Place.latitude == step["lat"], Place.longitude == step["lng"]
+            ).first()
+            if place:
+                logger.debug(f"[DB Hit] 기존 장소 발견 (Naver 위경도): {place.name}")
+                results[idx] = _place_to_dict(place)
+                continue
+        need_google.append(idx)
+
+    # 2. 구글 통합 검색 (좌표, 카테고리, 평점, 리뷰) - DB에 없는 후보만 동시에
+    google_results = _resolver.map(
+        lambda idx: _fetch_google_details(steps[idx]["name"], steps[idx]["address"]), # 주소 없어도 되나?
+        need_google
+    )
+
+    for idx, google_data in zip(need_google, google_results):
+        step = steps[idx]
+        road_name, road_addr = step["name"], step["address"]
+
+        gid = google_data.get("gid")
+        if gid:
             place = db.session.query(Place).filter(Place.gid == gid).first()
             if place:
                 logger.debug(f"[DB Hit] 기존 장소 발견 (Google gid): {place.name}")
-                place_data = {       
-                "name": place.name,
-                "address": place.address,
-                "category": place.category, 
-                "latitude": place.latitude,
-                "longitude": place.longitude,
-                "rating_avg": place.rating_avg,
-                "rating_count": place.rating_count,
-                "gid": place.gid,
-                "photo": get_full_photo_url(place.photo)
-                }   
-                final_results.append(place_data)
-                continue            
-
-        raw_photos = google_data.get("photos", [])
-        logger.debug(f"저장한 구글 사진들: {raw_photos}")
+                results[idx] = _place_to_dict(place)
+                continue
+
         # 3. 데이터 병합
         # 주소만 있는 경우도 설명하는가? >> 봐야함. 근데 아마 주소만 있으면 안되게 할 듯
-        if naver_success:
+        if step["naver_success"]:
             final_name = road_name
             final_address = road_addr
-            final_lat = lat
-            final_lng = lng
+            final_lat = step["lat"]
+            final_lng = step["lng"]
         else:
             final_name = google_data.get("name", road_name)
             final_address = google_data.get("address", road_addr)
             final_lat = google_data.get("latitude", 0.0)
             final_lng = google_data.get("longitude", 0.0)
-        
+
         if final_name == "" and final_address == "":
             logger.debug("[Google] 장소 추출 실패")
             continue
-        else:
-            place_obj = {
-                "name": final_name,
-                "address": final_address,
-                "category": google_data.get("category", "etc"),  
-                "latitude": final_lat,
-                "longitude": final_lng,
-                "rating_avg": google_data.get("rating_avg", 0.0),
-                "rating_count": google_data.get("rating_count", 0),
-                "gid": gid if gid else f"TEMP_{uuid.uuid4().hex[:10]}",
-                "photo": raw_photos if raw_photos else ""    # 4장
-            }
-            final_results.append(place_obj)
-        time.sleep(0.1)
-    return final_results
 
+        results[idx] = {
+            "name": final_name,
+            "address": final_address,
+            "category": google_data.get("category", "etc"),
+            "latitude": final_lat,
+            "longitude": final_lng,
+            "rating_avg": google_data.get("rating_avg", 0.0),
+            "rating_count": google_data.get("rating_count", 0),
+            "gid": gid if gid else f"TEMP_{uuid.uuid4().hex[:10]}",
+            "photo": ""    # 저장 후 photo_worker가 채움 (최대 4장)
+        }
 
+    return [r for r in results if r is not None]
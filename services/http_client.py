@@ -0,0 +1,115 @@
+import os
+import atexit
+import aiohttp
+from collections import Counter
+from PIL import ImageFile
+from services.my_logger import get_my_logger
+from services.loop_runner import background_loop
+from services.metrics import register_stats
+
+logger = get_my_logger(__name__)
+
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "50"))
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", "8"))
+HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", "300"))
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", "30"))
+
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(8 * 1024 * 1024)))
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(4096 * 4096)))
+IMAGE_DOWNLOAD_TIMEOUT = float(os.getenv("IMAGE_DOWNLOAD_TIMEOUT", "15"))
+CHUNK_SIZE = 64 * 1024
+
+'''
+프로세스 공용 aiohttp 세션 (background_loop 전용).
+요청마다 세션을 새로 만들지 않아서 인스타그램 / CDN 커넥션(TLS)과 DNS 조회 결과를 재사용.
+쿠키는 저장하지 않음 (유저 간 상태 공유 방지)
+'''
+
+download_counter = Counter()
+
+class DownloadTooLarge(Exception):
+    pass
+
+_session = None
+_session_pid = None
+
+def _get_session():
+    global _session, _session_pid
+    # fork 이후에는 부모 루프에 묶인 세션을 쓸 수 없으므로 새로 만듦
+    if _session is None or _session.closed or _session_pid != os.getpid():
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE,
+        )
+        _session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar())
+        _session_pid = os.getpid()
+    return _session
+
+async def _fetch_text(url, headers, timeout):
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with _get_session().get(url, headers=headers, timeout=client_timeout, allow_redirects=True) as response:
+        return response.status, str(response.url), await response.text()
+
+async def fetch_text(url, headers=None, timeout=10):
+    """(status, 최종 URL, 본문) 반환"""
+    return await background_loop.run(_fetch_text(url, headers, timeout))
+
+async def _stream_image(url, max_bytes, max_pixels):
+    client_timeout = aiohttp.ClientTimeout(total=IMAGE_DOWNLOAD_TIMEOUT)
+    async with _get_session().get(url, timeout=client_timeout) as response:
+        if response.status != 200:
+            download_counter["failed"] += 1
+            logger.info(f"다운로드 실패 ({response.status}): {url[:80]}")
+            return None
+        if response.content_length and response.content_length > max_bytes:
+            download_counter["too_large"] += 1
+            raise DownloadTooLarge(f"Content-Length {response.content_length} > {max_bytes}")
+
+        # 헤더까지만 디코딩해서 가로x세로가 너무 큰 이미지는 본문을 다 받기 전에 중단
+        parser = ImageFile.Parser()
+        checked = False
+        data = bytearray()
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            data += chunk
+            if len(data) > max_bytes:
+                download_counter["too_large"] += 1
+                raise DownloadTooLarge(f"{len(data)} bytes > {max_bytes}")
+            if not checked:
+                try:
+                    parser.feed(chunk)
+                except Exception as e:
+                    download_counter["failed"] += 1
+                    logger.info(f"이미지가 아닌 응답: {e}")
+                    return None
+                if parser.image is not None:
+                    width, height = parser.image.size
+                    if width * height > max_pixels:
+                        download_counter["too_large"] += 1
+                        raise DownloadTooLarge(f"{width}x{height} > {max_pixels} px")
+                    checked = True
+
+        download_counter["downloads"] += 1
+        download_counter["bytes"] += len(data)
+        return data
+
+async def download_image(url, max_bytes=IMAGE_MAX_BYTES, max_pixels=IMAGE_MAX_PIXELS):
+    """이미지를 스트리밍으로 받아 bytearray 반환. 실패 시 None, 상한 초과 시 DownloadTooLarge"""
+    return await background_loop.run(_stream_image(url, max_bytes, max_pixels))
+
+def close():
+    if _session is None or _session.closed or _session_pid != os.getpid():
+        return
+    try:
+        background_loop.run_sync(_session.close(), timeout=5)
+    except Exception as e:
+        logger.warning(f"HTTP 세션 종료 실패: {e}")
+
+def http_stats() -> dict:
+    stats = dict(download_counter)
+    stats["session_open"] = _session is not None and not _session.closed
+    return stats
+
+atexit.register(close)
+register_stats("http", http_stats)
@@ -0,0 +1,250 @@
+import io
+import os
+import hashlib
+import asyncio
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image, ImageFilter
+from services.my_logger import get_my_logger
+
+logger = get_my_logger(__name__)
+
+# 0이면 프로세스 풀 없이 스레드에서 처리. python app.py로 직접 띄울 때는 워커마다 app.py 전체가 다시 import되므로 0 권장 (_get_pool 참고)
+IMAGE_PREPROCESS_WORKERS = int(os.getenv("IMAGE_PREPROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+# 글자 유무 판단용: 이 밝기 차 이상을 엣지로 보고, 엣지 픽셀 비율을 점수로 사용
+TEXT_EDGE_THRESHOLD = int(os.getenv("TEXT_EDGE_THRESHOLD", "60"))
+TEXT_SAMPLE_SIZE = 400
+# fixed: 상단 고정 크롭 + 최대 800px / adaptive: 글자 영역만 잘라 글자 높이 기준으로 축소
+OCR_PREPROCESS_MODE = os.getenv("OCR_PREPROCESS_MODE", "fixed")
+TEXT_TARGET_LINE_HEIGHT = int(os.getenv("TEXT_TARGET_LINE_HEIGHT", "24"))  # 축소 후 글자 줄 높이(px)
+ADAPTIVE_MIN_SIZE = int(os.getenv("ADAPTIVE_MIN_SIZE", "480"))
+ADAPTIVE_MAX_SIZE = int(os.getenv("ADAPTIVE_MAX_SIZE", "1280"))
+TEXT_LINE_DENSITY = 0.02  # 행/열의 엣지 비율이 이 이상이면 글자가 있는 줄로 봄
+
+'''
+OCR 전 이미지 전처리 (디코딩 / 크롭 / 리사이즈 / 흑백 / 지문).
+CPU 작업이라 전용 프로세스 풀에서 실행. 다운로드한 바이트는 공유 메모리에 복사해 이름만 넘기고
+(워커 안에서 디코딩용 BytesIO로 한 번 더 복사), 결과 픽셀은 pickle로 돌려받음.
+프로세스 풀 워커에서도 import 되는 모듈이라 Pillow 외 무거운 의존성은 넣지 않음
+(단, 워커는 실행 스크립트(__main__)도 다시 import함 → _get_pool 참고)
+'''
+
+def crop_and_save_image(image_data, cut_height=250, encode=True):
+    """(JPEG 버퍼, 흑백 PIL 이미지) 반환. encode=False면 JPEG 인코딩은 건너뛰고 버퍼는 None"""
+    try:
+        with Image.open(io.BytesIO(image_data)) as img:
+            w, h = img.size
+
+            # 1. 윗부분 크롭 (상단 불필요 정보 제거)
+            if h > cut_height:
+                crop_box = (0, cut_height, w, h)
+                img = img.crop(crop_box)
+
+            # 2. 리사이징 (BILINEAR: 속도 최우선)
+            max_size = 800
+            if max(img.size) > max_size:
+                ratio = max_size / max(img.size)
+                new_size = (int(img.width * ratio), int(img.height * ratio))
+                img = img.resize(new_size, Image.Resampling.BILINEAR)
+
+            # 3. 흑백 변환 (OCR 인식률 유지하면서 용량 감소)
+            if img.mode in ("RGBA", "P"):
+                img = img.convert("RGB")
+            img = img.convert("L")
+
+            if not encode:
+                return None, img
+
+            # 4. 저장 (optimize=False로 저장 속도 확보)
+            output_buffer = io.BytesIO()
+            img.save(output_buffer, format='JPEG', quality=50)
+            output_buffer.seek(0) # 포인터 초기화
+
+            return output_buffer, img
+
+    except Exception as e:
+        logger.error(f"이미지 처리 에러: {e}")
+        return None
+
+def dhash(pil_image, size=16) -> str:
+    """인접 픽셀 밝기 비교 해시(size*size bit, 기본 256bit). 크기/압축 차이에는 둔감"""
+    small = pil_image.convert("L").resize((size + 1, size), Image.Resampling.BILINEAR)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{size * size // 4}x}"
+
+def image_fingerprint(pil_image) -> str:
+    """
+    "<픽셀 sha256>:<dHash>". OCR 캐시는 앞부분(전처리된 픽셀이 완전히 같은지)으로만 재사용하고,
+    dHash는 유사 이미지 후보 찾기에만 사용 (같은 템플릿에 가게명만 다른 슬라이드는 dHash가 거의 같음)
+    """
+    digest = hashlib.sha256(f"{pil_image.mode}{pil_image.size}".encode("utf-8") + pil_image.tobytes()).hexdigest()[:32]
+    return f"{digest}:{dhash(pil_image)}"
+
+def edge_density(pil_image) -> float:
+    """
+    강한 엣지 픽셀 비율 (0~1). 글자는 배경과 대비가 커서 엣지가 촘촘하고,
+    음식/인테리어 사진처럼 부드러운 이미지는 낮게 나옴
+    """
+    small = pil_image.convert("L")
+    if max(small.size) > TEXT_SAMPLE_SIZE:
+        small.thumbnail((TEXT_SAMPLE_SIZE, TEXT_SAMPLE_SIZE), Image.Resampling.BILINEAR)
+    histogram = _find_edges(small).histogram()
+    strong = sum(histogram[TEXT_EDGE_THRESHOLD:])
+    return strong / max(sum(histogram), 1)
+
+def _find_edges(pil_image):
+    """FIND_EDGES 결과에서 1px 테두리를 뺀 이미지. 테두리는 원본 픽셀이 그대로 복사돼 밝은 이미지면 전부 엣지로 잡힘"""
+    edges = pil_image.filter(ImageFilter.FIND_EDGES)
+    if edges.width <= 2 or edges.height <= 2:
+        return edges
+    return edges.crop((1, 1, edges.width - 1, edges.height - 1))
+
+def _edge_lines(edges, length):
+    """이진 엣지 이미지의 행별 엣지 비율이 기준 이상인 행 번호 목록"""
+    data = edges.tobytes()
+    width = edges.width
+    return [y for y in range(edges.height)
+            if data[y * width:(y + 1) * width].count(255) / length >= TEXT_LINE_DENSITY]
+
+def _runs(lines):
+    """연속된 행 번호 묶음의 길이 목록 (= 글자 줄 높이 후보)"""
+    runs, start = [], None
+    for prev, cur in zip([None] + lines, lines):
+        if prev is None or cur != prev + 1:
+            if start is not None:
+                runs.append(prev - start + 1)
+            start = cur
+    if start is not None:
+        runs.append(lines[-1] - start + 1)
+    return runs
+
+def adaptive_text_crop(image_data):
+    """
+    글자가 있는 영역만 잘라내고, 글자 줄 높이가 TEXT_TARGET_LINE_HEIGHT 정도가 되는
+    가장 작은 해상도로 축소. 글자 영역을 못 찾으면 전체 이미지를 최소 크기로 축소
+    """
+    try:
+        with Image.open(io.BytesIO(image_data)) as img:
+            if img.mode in ("RGBA", "P"):
+                img = img.convert("RGB")
+            gray = img.convert("L")
+    except Exception as e:
+        logger.error(f"이미지 처리 에러: {e}")
+        return None
+
+    sample = gray.copy()
+    sample.thumbnail((TEXT_SAMPLE_SIZE, TEXT_SAMPLE_SIZE), Image.Resampling.BILINEAR)
+    ratio = gray.width / sample.width
+    edges = _find_edges(sample).point(lambda v: 255 if v >= TEXT_EDGE_THRESHOLD else 0)
+    offset = (sample.width - edges.width) // 2  # 테두리를 뺀 만큼 좌표 보정
+
+    rows = [y + offset for y in _edge_lines(edges, edges.width)]
+    cols = [x + offset for x in _edge_lines(edges.transpose(Image.Transpose.TRANSPOSE), edges.height)]
+
+    if rows and cols:
+        pad = 4
+        box = (
+            int(max(cols[0] - pad, 0) * ratio),
+            int(max(rows[0] - pad, 0) * ratio),
+            int(min(cols[-1] + 1 + pad, sample.width) * ratio),
+            int(min(rows[-1] + 1 + pad, sample.height) * ratio),
+        )
+        gray = gray.crop(box)
+        runs = sorted(_runs(rows))
+        line_height = runs[len(runs) // 2] * ratio
+        scale = min(TEXT_TARGET_LINE_HEIGHT / line_height, 1.0) if line_height else 1.0
+    else:
+        scale = ADAPTIVE_MIN_SIZE / max(gray.size)
+
+    long_side = max(gray.size)
+    target = long_side * scale
+    target = max(target, min(ADAPTIVE_MIN_SIZE, long_side)) # 너무 작게 줄이지 않음
+    target = min(target, ADAPTIVE_MAX_SIZE)
+    if target < long_side:
+        factor = target / long_side
+        new_size = (max(int(gray.width * factor), 1), max(int(gray.height * factor), 1))
+        gray = gray.resize(new_size, Image.Resampling.LANCZOS)
+
+    return None, gray
+
+def _preprocess(image_data, cut_height):
+    # OCR 경로는 PIL 이미지만 쓰므로 JPEG 인코딩 생략
+    if OCR_PREPROCESS_MODE == "adaptive":
+        result = adaptive_text_crop(image_data)
+    else:
+        result = crop_and_save_image(image_data, cut_height, encode=False)
+    if not result:
+        return None
+    _, img = result
+    return img.mode, img.size, img.tobytes(), image_fingerprint(img), edge_density(img)
+
+def _preprocess_shared(shm_name, size, cut_height):
+    """프로세스 풀 워커에서 실행. 공유 메모리에 있는 원본 바이트를 읽어 처리"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        view = shm.buf[:size]
+        try:
+            return _preprocess(view, cut_height)
+        finally:
+            view.release()
+    finally:
+        shm.close()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # 브라우저/이벤트 루프 스레드가 떠 있는 프로세스를 fork 하지 않도록 forkserver 사용.
+            # forkserver에는 이 모듈만 미리 올리지만, 워커는 시작할 때 실행 스크립트를 __mp_main__으로 다시 import함.
+            # gunicorn으로 띄우면 __main__이 gunicorn 실행 스크립트라 워커는 Pillow + 이 모듈 정도지만,
+            # python app.py로 띄우면 워커마다 라우트 / playwright / geopandas / openai / genai까지 올라감
+            # → 워커 수(IMAGE_PREPROCESS_WORKERS)는 그만큼의 메모리를 감안해서 정하고, 개발 환경에서는 0(스레드) 사용
+            ctx = multiprocessing.get_context("forkserver")
+            ctx.set_forkserver_preload([__name__])
+            _pool = ProcessPoolExecutor(max_workers=IMAGE_PREPROCESS_WORKERS, mp_context=ctx)
+            logger.info(f"[preprocess] 프로세스 풀 시작 (workers={IMAGE_PREPROCESS_WORKERS})")
+        return _pool
+
+def _reset_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+async def preprocess_image(image_data, cut_height=150):
+    """다운로드한 이미지 바이트 → (흑백 PIL 이미지, 지문(image_fingerprint), 엣지 밀도). 실패 시 None"""
+    if IMAGE_PREPROCESS_WORKERS <= 0 or not image_data:
+        result = await asyncio.to_thread(_preprocess, image_data, cut_height)
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=len(image_data))
+        try:
+            shm.buf[:len(image_data)] = image_data
+            pool = _get_pool()
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    pool, _preprocess_shared, shm.name, len(image_data), cut_height)
+            except BrokenProcessPool:
+                logger.error("[preprocess] 프로세스 풀 비정상 종료, 다시 띄우고 이번 이미지는 스레드에서 처리")
+                _reset_pool(pool)
+                result = await asyncio.to_thread(_preprocess, image_data, cut_height)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    if result is None:
+        return None
+    mode, size, raw, fingerprint, density = result
+    return Image.frombytes(mode, size, raw), fingerprint, density
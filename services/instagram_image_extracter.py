@@ -1,209 +1,414 @@
 from flask import request
-import json, os, re, io
-import asyncio, aiohttp
-import html
+import json, os, re, time
+import asyncio
+import threading
 from google import genai
 from google.genai import types
-from PIL import Image
+from collections import Counter
 from services.my_logger import get_my_logger
-from services.browser_manager import global_browser_manager
+from services.browser_queue import BrowserBusyError, PRIORITY_OCR
+from services.post_snapshot import get_post_snapshot
+from services.metrics import register_stats
+from services.ocr_cache import get_cached_ocr, set_cached_ocr
+from services.llm_cache import prompt_version
+from services.http_client import download_image
+from services.ocr_prefetch import load_staged_inputs
+from services.check_post import get_shortcode
+from services.image_preprocess import preprocess_image, OCR_PREPROCESS_MODE
 
 # 설정
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# 단계별 동시 작업 수 / 단계 사이 대기열 크기
+OCR_DOWNLOAD_WORKERS = int(os.getenv("OCR_DOWNLOAD_WORKERS", "4"))
+OCR_PREPROCESS_WORKERS = int(os.getenv("OCR_PREPROCESS_WORKERS", "2"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "3")) # 요청 1건 안의 OCR 워커 수
+OCR_MAX_CONCURRENT_CALLS = int(os.getenv("OCR_MAX_CONCURRENT_CALLS", "3")) # 프로세스 전체 Gemini 동시 호출 제한
+OCR_STAGE_QUEUE_SIZE = int(os.getenv("OCR_STAGE_QUEUE_SIZE", "3"))
+# 서로 다른 장소를 이만큼 찾으면 남은 이미지는 건너뜀 (0이면 끝까지)
+OCR_TARGET_PLACES = int(os.getenv("OCR_TARGET_PLACES", "8"))
+OCR_TIME_BUDGET = float(os.getenv("OCR_TIME_BUDGET", "25"))
+# 한 번의 Gemini 요청에 묶을 이미지 수 / 용량 (1이면 이미지마다 따로 요청)
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "4"))
+OCR_BATCH_MAX_BYTES = int(os.getenv("OCR_BATCH_MAX_BYTES", str(3 * 1024 * 1024)))
+OCR_BATCH_WAIT = float(os.getenv("OCR_BATCH_WAIT", "0.3"))
+# 엣지 밀도가 이보다 낮으면 글자 없는 사진으로 봄. 임계값을 측정하기 전까지는 log 모드(점수만 기록, OCR은 그대로)
+# off: 사용 안 함 / log: 건너뛸 이미지 수와 점수만 기록 / on: 실제로 OCR 생략
+TEXT_PREFILTER = os.getenv("TEXT_PREFILTER", "log")
+# 테두리 제외 기준 민무늬 이미지 0, 1080px 이미지에 24px 글자 한 줄 ≈ 0.0016
+TEXT_MIN_EDGE_DENSITY = float(os.getenv("TEXT_MIN_EDGE_DENSITY", "0.001"))
+
 logger = get_my_logger(__name__)
 client = genai.Client(api_key=GEMINI_API_KEY)
-sem = asyncio.Semaphore(3) # OCR 동시 요청 제한
-
-# 이미지 처리
-def crop_and_save_image(image_data, cut_height=250):
-    try:
-        with Image.open(io.BytesIO(image_data)) as img:
-            w, h = img.size
-        
-            # 1. 윗부분 크롭 (상단 불필요 정보 제거)
-            if h > cut_height:
-                crop_box = (0, cut_height, w, h)
-                img = img.crop(crop_box)
-            
-            # 2. 리사이징 (BILINEAR: 속도 최우선)
-            max_size = 800
-            if max(img.size) > max_size:
-                ratio = max_size / max(img.size)
-                new_size = (int(img.width * ratio), int(img.height * ratio))
-                img = img.resize(new_size, Image.Resampling.BILINEAR)
-            
-            # 3. 흑백 변환 (OCR 인식률 유지하면서 용량 감소)
-            if img.mode in ("RGBA", "P"):
-                img = img.convert("RGB")
-            img = img.convert("L")
-
-            # 4. 저장 (optimize=False로 저장 속도 확보)
-            output_buffer = io.BytesIO()
-            img.save(output_buffer, format='JPEG', quality=50)
-            output_buffer.seek(0) # 포인터 초기화
-            
-            return output_buffer, img
-
-    except Exception as e:
-        logger.error(f"이미지 처리 에러: {e}")
-        return None
 
-# 크롤링 로직 (리소스 차단 및 타임아웃 단축)
-async def extract_images(post_url: str):
-    ordered_images = []
-    seen_base_urls = set()
+# 요청 수 집계 (batch_requests + single_requests = 실제 Gemini 호출 수)
+ocr_counter = Counter()
+# 요청마다 이벤트 루프가 달라서 asyncio.Semaphore 대신 스레드 세마포어 (Gemini 호출은 to_thread에서 실행)
+ocr_call_slots = threading.BoundedSemaphore(OCR_MAX_CONCURRENT_CALLS)
 
-    playwright_obj, browser, context = await global_browser_manager.get_context()
-    page = await context.new_page()
+def ocr_stats() -> dict:
+    stats = dict(ocr_counter)
+    images = ocr_counter["images"]
+    stats["preprocess_mode"] = OCR_PREPROCESS_MODE
+    stats["text_prefilter"] = TEXT_PREFILTER
+    density_sum, checked = stats.pop("edge_density_sum", 0.0), ocr_counter["prefilter_checked"]
+    stats["avg_edge_density"] = round(density_sum / checked, 4) if checked else 0.0
+    # SDK가 실제로 보내는 인코딩 크기가 아니라 전처리 후 원시 픽셀 크기 (해상도 비교용)
+    stats["avg_raw_pixel_kb"] = round(ocr_counter["raw_pixel_bytes"] / images / 1024, 1) if images else 0.0
+    stats["avg_ocr_ms_per_image"] = round(ocr_counter["ocr_ms"] / images, 1) if images else 0.0
+    return stats
 
-    await page.route("**/*", lambda route: 
-        route.abort() if route.request.resource_type in ["media", "font", "stylesheet"] 
-        else route.continue_()
-    )
-
-    url_pattern = r'https://scontent[^\s"\'<]+|https:\\/\\/scontent[^\s"\'<]+'
-    dimension_pattern = re.compile(r'[ps]\d{2,4}x\d{2,4}')
-
-    def process_and_add(raw_urls):
-        for raw_url in raw_urls:
-            clean_url = raw_url.split('\\u003C')[0].split('<')[0]
-            clean_url = clean_url.split('\\u0022')[0].split('"')[0]
-            clean_url = clean_url.replace('\\/', '/')
-            clean_url = clean_url.replace('\\u0026', '&')
-            clean_url = clean_url.replace('\\u0025', '%') 
-            clean_url = html.unescape(clean_url)
-            
-            if ".mp4" in clean_url: continue 
-            if "dash" in clean_url or "segment" in clean_url.lower(): continue 
-            if "/t51.2885-19/" in clean_url: continue 
-            if "vp/" in clean_url: continue 
-            if dimension_pattern.search(clean_url): continue
-            if re.search(r'\/s\d{3,4}x\d{3,4}\/', clean_url): continue
-            if "c0." in clean_url: continue
-            
-            base_url = clean_url.split('?')[0]
-            if base_url not in seen_base_urls:
-                seen_base_urls.add(base_url)
-                ordered_images.append(clean_url)
-
-    async def handle_response(response):
-        if "graphql/query" in response.url or "api/v1" in response.url:
-            try:
-                body = await response.text()
-                matches = re.findall(url_pattern, body)
-                process_and_add(matches)
-            except:
-                pass
+register_stats("ocr", ocr_stats)
 
-    page.on("response", handle_response)
+# 이미지 URL 추출 (eligibility 단계에서 이미 연 게시물이면 snapshot 캐시 사용)
+async def extract_images(post_url: str, user_id=None):
+    ordered_images = []
 
     try:
-        await page.goto(post_url, wait_until="domcontentloaded", timeout=10000)
-        html_content = await page.content()
-        process_and_add(re.findall(url_pattern, html_content))
-        await page.wait_for_load_state("networkidle", timeout=5000)
-
-        if len(ordered_images) > 10:
-            ordered_images = ordered_images[:10]
-
+        snapshot = await get_post_snapshot(post_url, user_id=user_id, priority=PRIORITY_OCR)
+        ordered_images = snapshot["image_urls"]
+    except BrowserBusyError:
+        raise
     except Exception as e:
         logger.error(f"추출 에러: {e}")
-    finally:
-        try:
-            await page.close()
-        except Exception:
-            pass
-        await global_browser_manager.release(playwright_obj, browser, context)
 
     return ordered_images
-# 다운로드
-async def process_download(session, img_url):
-    try:
-        async with session.get(img_url) as response:
-            if response.status == 200:
-                data = await response.read()
-                
-                result = await asyncio.to_thread(crop_and_save_image, data, 150)
-                # 크롭 결과가 None인지 확인
-                if not result: 
-                    logger.info(f"크롭 결과 없음: {result}]")
-                    return None, None
-
-                byte_buffer, pil_image = result # 언팩 에러 방지
-                async with sem:
-                    ocr_result = await asyncio.to_thread(gemini_flash_ocr, pil_image)
-                return ocr_result
 
-    except Exception as e:
-        logger.error(f"개별 처리 에러: {e}")
-        return None
-
-def gemini_flash_ocr(pil_image):
-    try:
- 
-        response = client.models.generate_content(
-        model='gemini-2.5-flash-lite',
-        contents=[
-            """이미지에서 텍스트를 추출할 때 다음 규칙을 절대적으로 준수해:
+OCR_MODEL = 'gemini-2.5-flash-lite'
+OCR_PROMPT = """이미지에서 텍스트를 추출할 때 다음 규칙을 절대적으로 준수해:
             1. 너의 배경지식을 활용해 단어를 '교정'하거나 '추정'하지 마.
             2. '삼원샏'처럼 한국어 맞춤법에 어긋나거나 생소한 단어라도 이미지에 보이는 '모양 그대로' 추출해.
             3. 글자가 뭉쳐있다면 'ㅅ, ㅏ, ㅁ, ㅇ, ㅜ, ㅓ, ㄴ, ㅅ, ㅐ, ㄷ' 처럼 자음과 모음을 하나씩 꼼꼼히 확인해.
-            4. 이미지에서 모든 텍스트를 추출(raw_text)한 뒤, 그 내용을 바탕으로 상호명과 주소(places)를 구분해서 정리해줘.""",
-            pil_image
-        ],
-        config=types.GenerateContentConfig(
-            response_mime_type="application/json", 
-            temperature=0.1, # 좀 더 테스트
-            top_p=0.1,   
-            response_schema={
+            4. 이미지에서 모든 텍스트를 추출(raw_text)한 뒤, 그 내용을 바탕으로 상호명과 주소(places)를 구분해서 정리해줘."""
+OCR_BATCH_PROMPT = OCR_PROMPT + """
+            5. 여러 장의 이미지가 '[이미지 N]' 표시 뒤에 하나씩 주어져. 이미지끼리 내용을 섞지 말고, 이미지마다 image_index(N)를 붙여 따로 정리해."""
+
+IMAGE_RESULT_PROPERTIES = {
+    "raw_text": {
+        "type": "STRING",
+        "description": "이미지에 보이는 모든 텍스트를 빠짐없이 있는 그대로 먼저 다 적어."
+    },
+    "places": {
+        "type": "ARRAY",
+        "items": {
+            "type": "OBJECT",
+            "properties": {
+                "name": {"type": "STRING", "description": "가게 이름 (ex: 코히루). 없으면 빈 문자열"},
+                "address": {"type": "STRING", "description": "도로명/지번 주소 (ex: 서울 중구 동호로...). 없으면 빈 문자열"}
+            }
+        }
+    }
+}
+
+BATCH_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "images": {
+            "type": "ARRAY",
+            "items": {
                 "type": "OBJECT",
                 "properties": {
-                    "raw_text": {
-                        "type": "STRING", 
-                        "description": "이미지에 보이는 모든 텍스트를 빠짐없이 있는 그대로 먼저 다 적어."
-                    },
-                    "places": {
-                        "type": "ARRAY",
-                        "items": {
-                            "type": "OBJECT",
-                            "properties": {
-                                "name": {"type": "STRING", "description": "가게 이름 (ex: 코히루). 없으면 빈 문자열"},
-                                "address": {"type": "STRING", "description": "도로명/지번 주소 (ex: 서울 중구 동호로...). 없으면 빈 문자열"}
-                            }
-                        }
-                    }
-                }
+                    "image_index": {"type": "INTEGER", "description": "[이미지 N]의 N"},
+                    **IMAGE_RESULT_PROPERTIES,
+                },
+                "required": ["image_index", "places"]
             }
-        )
-    )  
-        
+        }
+    }
+}
+
+def _ocr_config(schema):
+    return types.GenerateContentConfig(
+        response_mime_type="application/json",
+        temperature=0.1, # 좀 더 테스트
+        top_p=0.1,
+        response_schema=schema
+    )
+
+# 모델 / 프롬프트 / 스키마 / 생성 설정이 바뀌면 OCR 캐시 키가 바뀜
+OCR_PROMPT_VERSION = prompt_version(
+    OCR_MODEL, OCR_PROMPT, OCR_BATCH_PROMPT,
+    json.dumps(BATCH_RESPONSE_SCHEMA, sort_keys=True, ensure_ascii=False),
+    "temperature=0.1", "top_p=0.1",
+)
+
+def gemini_flash_ocr(pil_image):
+    try:
+        ocr_counter["single_requests"] += 1
+        with ocr_call_slots:
+            response = client.models.generate_content(
+                model=OCR_MODEL,
+                contents=[OCR_PROMPT, pil_image],
+                config=_ocr_config({"type": "OBJECT", "properties": IMAGE_RESULT_PROPERTIES})
+            )
+
         data = json.loads(response.text)
-        
-        places_list = data.get('places', [])
-        valid_data = [item for item in places_list if item.get('name') and item['name'].strip() != ""]
-        
-        # 정제 로직
-        for item in valid_data:
-            # item['address']나 item['name'] None 경우 대비
-            raw_addr = item.get('address') or ""
-            raw_name = item.get('name') or ""
-            
-            clean_addr = re.sub(r'#\S+', '', raw_addr)
-            clean_addr = re.sub(r'[^\w\s\(\)\-,.]', '', clean_addr)
-            
-            clean_name = raw_name.replace('#', '')
-            clean_name = re.sub(r'[^\w\s\(\)\-,.&\'\+]', '', clean_name)
-            
-            item['address'] = clean_addr.strip()
-            item['name'] = clean_name.strip()
-        
-        return valid_data
+        return data.get('places', [])
     except Exception as e:
         return {"error": f"에러 발생: {str(e)}"}
 
+def gemini_flash_ocr_batch(pil_images):
+    """
+    여러 이미지를 한 번의 요청으로 OCR. 이미지 순서대로 places 리스트 반환.
+    응답에 빠진 이미지가 있으면 해당 위치는 None (호출한 쪽에서 단건으로 재시도)
+    """
+    contents = [OCR_BATCH_PROMPT]
+    for i, pil_image in enumerate(pil_images):
+        contents.append(f"[이미지 {i}]")
+        contents.append(pil_image)
+
+    ocr_counter["batch_requests"] += 1
+    with ocr_call_slots:
+        response = client.models.generate_content(
+            model=OCR_MODEL,
+            contents=contents,
+            config=_ocr_config(BATCH_RESPONSE_SCHEMA)
+        )
+
+    data = json.loads(response.text)
+    results = [None] * len(pil_images)
+    for entry in data.get('images', []):
+        i = entry.get('image_index')
+        if isinstance(i, int) and 0 <= i < len(pil_images) and results[i] is None:
+            results[i] = entry.get('places') or []
+    return results
+
+def normalize_places(places_list):
+    """OCR 결과 정제: 이름 없는 항목 제거, 해시태그/특수문자 제거"""
+    valid_data = [item for item in places_list if item.get('name') and item['name'].strip() != ""]
+
+    # 정제 로직
+    for item in valid_data:
+        # item['address']나 item['name'] None 경우 대비
+        raw_addr = item.get('address') or ""
+        raw_name = item.get('name') or ""
+
+        clean_addr = re.sub(r'#\S+', '', raw_addr)
+        clean_addr = re.sub(r'[^\w\s\(\)\-,.]', '', clean_addr)
+
+        clean_name = raw_name.replace('#', '')
+        clean_name = re.sub(r'[^\w\s\(\)\-,.&\'\+]', '', clean_name)
+
+        item['address'] = clean_addr.strip()
+        item['name'] = clean_name.strip()
+
+    return [item for item in valid_data if item['name']]
+
+# 스트리밍 OCR 파이프라인: 다운로드 → 크롭 → OCR → 정제
+# 단계마다 대기열 크기와 워커 수를 따로 두고, 끝난 이미지부터 결과를 넘김
+_DONE = object()
+
+async def _feed(image_urls, outbox, staged):
+    for index, img_url in enumerate(image_urls):
+        await outbox.put((index, (img_url, staged.get(index))))
+    await outbox.put(_DONE)
+
+async def _stage(name, func, inbox, outbox, workers):
+    async def worker():
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                await inbox.put(_DONE) # 같은 단계의 다른 워커도 종료
+                return
+            index, payload = item
+            try:
+                result = await func(payload)
+            except Exception as e:
+                logger.error(f"[OCR:{name}] {index}번 이미지 처리 에러: {e}")
+                result = None
+            if result is not None:
+                await outbox.put((index, result))
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    await outbox.put(_DONE)
+
+async def _download(payload):
+    img_url, staged = payload
+    # eligibility 때 미리 전처리해 둔 이미지면 다운로드/전처리 생략
+    if staged is not None:
+        return staged
+    # 공용 세션으로 스트리밍 다운로드 (용량/해상도 상한 초과 시 예외 → 해당 이미지만 건너뜀)
+    return await download_image(img_url)
+
+async def _preprocess(data):
+    if isinstance(data, tuple): # 미리 준비된 (이미지, 지문, 엣지 밀도)
+        result = data
+    else:
+        result = await preprocess_image(data, 150)
+    # 크롭 결과가 None인지 확인
+    if not result:
+        logger.info("크롭 결과 없음")
+        return None
+    pil_image, fingerprint, density = result
+
+    # 글자가 없어 보이는 사진은 OCR 없이 빈 결과로 넘김 (on 모드만)
+    if TEXT_PREFILTER in ("log", "on"):
+        ocr_counter["prefilter_checked"] += 1
+        ocr_counter["edge_density_sum"] += density
+        if density < TEXT_MIN_EDGE_DENSITY:
+            ocr_counter["prefilter_below_threshold"] += 1
+            logger.info(f"[OCR] 글자 없는 이미지 후보 (edge density {density:.4f}, 모드 {TEXT_PREFILTER})")
+            if TEXT_PREFILTER == "on":
+                ocr_counter["prefilter_skipped"] += 1
+                return {"image": pil_image, "fingerprint": fingerprint, "places": []}
+
+    # 같은(비슷한) 이미지를 이미 OCR 했으면 결과 재사용
+    places = await asyncio.to_thread(get_cached_ocr, fingerprint, OCR_PROMPT_VERSION)
+    return {"image": pil_image, "fingerprint": fingerprint, "places": places}
+
+async def _ocr(pil_image):
+    result = await asyncio.to_thread(gemini_flash_ocr, pil_image)
+    if isinstance(result, dict):
+        logger.error(f"OCR 실패: {result.get('error')}")
+        return None
+    return result
+
+def _image_bytes(payload):
+    # 원시 픽셀 크기(가로 x 세로 x 채널). 인코딩 후 전송 크기보다 항상 크므로 배치 용량 상한으로 사용
+    pil_image = payload["image"]
+    return pil_image.width * pil_image.height * len(pil_image.getbands())
+
+def _store_results(items, results):
+    for (_, payload), places in zip(items, results):
+        if places is not None:
+            set_cached_ocr(payload["fingerprint"], OCR_PROMPT_VERSION, normalize_places(places))
+
+async def _ocr_batch(items):
+    """[(index, payload)] → [(index, places)]. 배치 실패/누락 이미지는 단건 OCR로 폴백"""
+    ocr_counter["images"] += len(items)
+    raw_bytes = sum(_image_bytes(payload) for _, payload in items)
+    start = time.perf_counter()
+    if len(items) == 1:
+        results = [await _ocr(items[0][1]["image"])]
+    else:
+        try:
+            results = await asyncio.to_thread(gemini_flash_ocr_batch, [payload["image"] for _, payload in items])
+        except Exception as e:
+            logger.warning(f"배치 OCR 실패 ({len(items)}장), 단건으로 재시도: {e}")
+            results = [None] * len(items)
+
+        missing = [i for i, places in enumerate(results) if places is None]
+        if missing:
+            ocr_counter["fallback_images"] += len(missing)
+            retried = await asyncio.gather(*(_ocr(items[i][1]["image"]) for i in missing))
+            for i, places in zip(missing, retried):
+                results[i] = places
+
+    elapsed = time.perf_counter() - start
+    ocr_counter["raw_pixel_bytes"] += raw_bytes
+    ocr_counter["ocr_ms"] += int(elapsed * 1000)
+    logger.info(f"[OCR] {OCR_PREPROCESS_MODE} | {len(items)}장 | 픽셀 {raw_bytes / 1024:.0f}KB | "
+                f"{elapsed:.2f}s ({elapsed / len(items):.2f}s/장)")
+
+    # 실패(None)는 저장하지 않음. 빈 리스트는 글자 없는 이미지로 저장
+    await asyncio.to_thread(_store_results, items, results)
+    return [(index, places) for (index, _), places in zip(items, results) if places is not None]
+
+async def _ocr_stage(inbox, outbox, workers):
+    """
+    OCR 단계. 대기열에 쌓인 이미지를 OCR_BATCH_SIZE장 / OCR_BATCH_MAX_BYTES까지 묶어서 한 번에 요청.
+    다음 이미지는 OCR_BATCH_WAIT초까지만 기다림
+    """
+    async def worker():
+        carry = None # 용량 초과로 다음 배치로 넘긴 이미지
+        finished = False
+        while not finished:
+            item = carry if carry is not None else await inbox.get()
+            carry = None
+            if item is _DONE:
+                await inbox.put(_DONE)
+                return
+            if item[1]["places"] is not None: # 캐시 적중은 OCR 없이 바로 넘김
+                await outbox.put((item[0], item[1]["places"]))
+                continue
+
+            batch, size = [item], _image_bytes(item[1])
+            wait_until = time.monotonic() + OCR_BATCH_WAIT
+            while len(batch) < OCR_BATCH_SIZE:
+                try:
+                    nxt = await asyncio.wait_for(inbox.get(), max(wait_until - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    break
+                if nxt is _DONE:
+                    await inbox.put(_DONE)
+                    finished = True
+                    break
+                if nxt[1]["places"] is not None:
+                    await outbox.put((nxt[0], nxt[1]["places"]))
+                    continue
+                nxt_size = _image_bytes(nxt[1])
+                if size + nxt_size > OCR_BATCH_MAX_BYTES:
+                    carry = nxt
+                    break
+                batch.append(nxt)
+                size += nxt_size
+
+            try:
+                results = await _ocr_batch(batch)
+            except Exception as e:
+                logger.error(f"[OCR:ocr] {[index for index, _ in batch]}번 이미지 처리 에러: {e}")
+                results = []
+            for result in results:
+                await outbox.put(result)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    await outbox.put(_DONE)
+
+async def _normalize(places_list):
+    return normalize_places(places_list)
+
+def _place_key(place):
+    return re.sub(r'\s+', '', place.get('name', '')).lower()
+
+async def stream_ocr_places(image_urls, staged=None):
+    """
+    이미지별 OCR 결과를 끝나는 순서대로 (index, places)로 yield.
+    서로 다른 장소가 OCR_TARGET_PLACES개 모이거나 OCR_TIME_BUDGET을 넘기면 남은 작업은 취소.
+    staged: {index: (PIL 이미지, 지문, 엣지 밀도)} 미리 전처리된 이미지
+    """
+    if not image_urls:
+        return
+
+    queues = [asyncio.Queue(OCR_STAGE_QUEUE_SIZE) for _ in range(4)]
+    results = asyncio.Queue()
+    deadline = time.monotonic() + OCR_TIME_BUDGET
+    found = set()
+    done_count = 0
+
+    tasks = [
+        asyncio.create_task(_feed(image_urls, queues[0], staged or {})),
+        asyncio.create_task(_stage("download", _download, queues[0], queues[1], OCR_DOWNLOAD_WORKERS)),
+        asyncio.create_task(_stage("crop", _preprocess, queues[1], queues[2], OCR_PREPROCESS_WORKERS)),
+        asyncio.create_task(_ocr_stage(queues[2], queues[3], OCR_WORKERS)),
+        asyncio.create_task(_stage("normalize", _normalize, queues[3], results, 1)),
+    ]
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                item = await asyncio.wait_for(results.get(), max(remaining, 0))
+            except asyncio.TimeoutError:
+                logger.info(f"[OCR] 시간 예산 {OCR_TIME_BUDGET}s 초과, {done_count}/{len(image_urls)}장 결과만 사용")
+                break
+            if item is _DONE:
+                break
+
+            index, places = item
+            done_count += 1
+            found.update(_place_key(p) for p in places)
+            yield index, places
+
+            if OCR_TARGET_PLACES and len(found) >= OCR_TARGET_PLACES:
+                logger.info(f"[OCR] 장소 {len(found)}곳 확보, {done_count}/{len(image_urls)}장에서 조기 종료")
+                break
+    finally:
+        # to_thread로 이미 보낸 OCR 호출은 끝까지 돌지만 결과는 버림
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
 # 메인
-async def extract_insta_images(url=""):
+async def extract_insta_images(url="", user_id=None):
     # Flask request 객체 처리 (JSON 바디가 없으면 인자 url 사용)
     target_url = url
     try:
@@ -219,24 +424,28 @@ async def extract_insta_images(url=""):
     
     try:        
         # 전역 매니저를 넘겨줌
-        image_urls = await extract_images(target_url)
+        image_urls = await extract_images(target_url, user_id)
         logger.debug(f"{len(image_urls)}장 URL 확보 완료")
 
         if image_urls:
             logger.info("이미지 다운로드 및 변환 중...")
-            connector = aiohttp.TCPConnector(limit=10)
-            async with aiohttp.ClientSession(connector=connector) as session:
-                tasks = [process_download(session, img_url) for img_url in image_urls[1:]]
-                results = await asyncio.gather(*tasks)
-            
+            # 첫 장(표지)은 제외. 결과는 도착하는 대로 받고, 최종 순서는 게시물 순서로 맞춤
+            ocr_urls = image_urls[1:]
+            staged = await asyncio.to_thread(load_staged_inputs, get_shortcode(target_url), ocr_urls)
+            if staged:
+                logger.info(f"미리 준비된 이미지 {len(staged)}/{len(ocr_urls)}장 사용")
+
+            by_index = {}
+            async for index, places in stream_ocr_places(ocr_urls, staged):
+                logger.debug(f"[OCR] {index + 2}번째 이미지: {len(places)}곳")
+                by_index[index] = places
+
             # 2차원 리스트([[{},{}], [{},{}]])를 1차원으로 평탄화
-            for res in results:                
-                if res:
-                    if isinstance(res, list):
-                        ocr_results.extend(res)
-                    elif isinstance(res, dict) and "error" not in res:
-                        ocr_results.append(res)
-            logger.debug("OCR 결과: {ocr_results}")
+            for index in sorted(by_index):
+                ocr_results.extend(by_index[index])
+            logger.debug(f"OCR 결과: {ocr_results}")
+    except BrowserBusyError:
+        raise
     except Exception as e:
         logger.error(f"전체 프로세스 에러: {e}")
         return {"error": str(e)}
@@ -1,15 +1,24 @@
-import asyncio
 import json
 import re
 import os
+import random
+import asyncio
 from konlpy.tag import Kkma # 좀 더 가벼운 모델로 변경
 from collections import Counter
-from openai import OpenAI
+from openai import AsyncOpenAI, APITimeoutError, APIConnectionError, RateLimitError, InternalServerError
 from services.my_logger import get_my_logger
-from services.browser_manager import global_browser_manager
+from services.browser_queue import BrowserBusyError, PRIORITY_PROBE
+from services.post_snapshot import get_post_snapshot
+from services.loop_runner import background_loop
+from services.llm_cache import get_cached_places, set_cached_places, prompt_version
 
 logger = get_my_logger(__name__)
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "20"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_RETRY_BASE = float(os.getenv("OPENAI_RETRY_BASE", "0.5"))
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "4"))
+RETRYABLE_GPT_ERRORS = (APITimeoutError, APIConnectionError, RateLimitError, InternalServerError)
 
 KOREAN_REGIONS = [
     # 1. 광역자치단체
@@ -45,120 +54,26 @@ KOREAN_REGIONS = [
     "연천", "연천군", "가평", "가평군", "양평", "양평군"
     ]
 
-async def get_caption_no_login(post_url: str):
+async def get_caption_no_login(post_url: str, user_id=None):
     caption_text = ""
-    success_step = "failed"
-    context = None
-    page = None
     shortcode = _extract_shortcode_from_url(post_url)
 
     try:
-        playwright_obj, browser, context = await global_browser_manager.get_context(
-        locale="ko-KR",
-        viewport={"width": 360, "height": 800}
-        )
-        page = await context.new_page()
-
-        await page.route("**/*", lambda route:
-            route.abort() if route.request.resource_type in ["image", "media", "font"]
-            else route.continue_()
-        )
-
-        logger.debug("페이지 goto 시작")
-        page.on("framenavigated", lambda frame: logger.debug(f"프레임 이동: {frame.url}"))
-        await page.goto(post_url, wait_until="domcontentloaded", timeout=15000)
-        logger.debug("페이지 goto 완료")
-        
-        logger.debug("1단계: 일반 게시물 로직 시도...")
-        
-        # 일반 포스트
-        # 1-1. JSON-LD
-        try:
-            json_ld_handle = await page.query_selector('script[type="application/ld+json"]')
-            if json_ld_handle:
-                json_text = await json_ld_handle.inner_text()
-                data = json.loads(json_text)
-                
-                if "caption" in data:
-                    caption_text = data["caption"]
-                elif "articleBody" in data:
-                    caption_text = data["articleBody"]
-                
-                if caption_text:
-                    success_step = "1-1 (JSON-LD)"
-            logger.debug(f"1-1 결과: {caption_text[:20] if caption_text else 'None'}")
-        except: pass
-
-        # 1-2. 정규식(Regex)
-        if not caption_text:
-            try:
-                content = await page.content()
-                patterns = [
-                    r'"edge_media_to_caption"\s*:\s*\{\s*"edges"\s*:\s*\[\s*\{\s*"node"\s*:\s*\{\s*"text"\s*:\s*"([^"]+)"',
-                    r'"caption"\s*:\s*\{\s*"text"\s*:\s*"([^"]+)"'
-                ]
-                caption_text = _find_caption_near_shortcode(content, shortcode, patterns)
-                if caption_text:
-                    success_step = "1-2 (Regex, scoped)"
-            except: pass
-
-
-        # 릴스
-        if not caption_text:
-            logger.debug("1단계 실패. 2단계(릴스 로직)로 전환합니다...")
-
-            # 2-1. Meta Tag 추출
-            try:
-                meta_desc = await page.get_attribute('meta[property="og:description"]', 'content')
-                if meta_desc:
-                    if ": \"" in meta_desc:
-                        caption_text = meta_desc.split(": \"", 1)[1].rsplit("\"", 1)[0]
-                    elif ": “" in meta_desc:
-                            caption_text = meta_desc.split(": “", 1)[1].rsplit("”", 1)[0]
-                    else:
-                        caption_text = meta_desc
-                    
-                    if caption_text:
-                        success_step = "2-1 (Reels Logic)"
-            except: pass
-
-            # 2-2. UI 요소 직접 추출
-            if not caption_text:
-                try:
-                    # 릴스나 게시물의 본문은 보통 h1 태그나 특정 클래스에 있음
-                    element = await page.query_selector('h1')
-                    if not element:
-                        element = await page.query_selector('div[data-testid="content-container"] span')
-                    
-                    if element:
-                        caption_text = await element.inner_text()
-                        success_step = "2-2 (Reels UI element)"
-                except: pass
-
-            # 2-3. 정규식 
-            if not caption_text:
-                content = await page.content()
-                reel_patterns = [r'"clips_metadata"\s*:\s*\{.*?"caption"\s*:\s*"([^"]+)"']
-                caption_text = _find_caption_near_shortcode(content, shortcode, reel_patterns)
-                if caption_text:
-                    success_step = "2-3 (Reels Regex, scoped)"
+        # 캐시 → HTTP(브라우저 없이) → 브라우저 순으로 시도
+        snapshot = await get_post_snapshot(post_url, user_id=user_id, priority=PRIORITY_PROBE, need="caption")
+        caption_text = snapshot["caption"]
+        success_step = snapshot["caption_step"]
             
         if caption_text:
             # 성공 시: URL, 성공한 단계, 본문 앞부분 출력
-            logger.info(f"[SUCCESS] {post_url} | Step: {success_step} | shortcode: {shortcode} | Text: {caption_text[:10]}...")
+            logger.info(f"[SUCCESS] {post_url} | Tier: {snapshot.get('source')} | Step: {success_step} | shortcode: {shortcode} | Text: {caption_text[:10]}...")
         else:
             logger.warning(f"[FAILED] {post_url} | 캡션을 찾지 못했습니다.")
 
+    except BrowserBusyError:
+        raise
     except Exception as e:
         logger.error(f"Playwright 에러: {type(e).__name__} - {e}")
-    finally:
-        if page:
-            try:
-                await asyncio.wait_for(page.close(), timeout=10)
-            except Exception as e:
-                logger.error(f"page close 실패: {e}")
-        if context:
-            await global_browser_manager.release(playwright_obj, browser, context)
 
     return caption_text
 
@@ -215,30 +130,6 @@ def _extract_shortcode_from_url(url: str) -> str:
     match = re.search(r'/(?:p|reel|reels|tv)/([^/?#&]+)', url)
     return match.group(1) if match else ""
 
-def _find_caption_near_shortcode(content: str, shortcode: str, patterns: list) -> str:
-    """전체 페이지가 아니라, 해당 shortcode 주변 블록에서만 캡션 검색"""
-    if not shortcode:
-        return ""
-
-    shortcode_pattern = re.compile(r'"shortcode"\s*:\s*"' + re.escape(shortcode) + r'"')
-    sc_match = shortcode_pattern.search(content)
-
-    if not sc_match:
-        logger.debug(f"[DEBUG] 페이지 내 shortcode({shortcode}) 위치를 못 찾음")
-        return ""
-
-    # shortcode 위치 기준 앞뒤 3000자 윈도우만 탐색
-    start = max(0, sc_match.start() - 3000)
-    end = min(len(content), sc_match.end() + 3000)
-    window = content[start:end]
-
-    for pattern in patterns:
-        match = re.search(pattern, window)
-        if match:
-            raw_text = match.group(1)
-            return json.loads(f'"{raw_text}"')
-    return ""
-
 def check_rulebase_place(list_caption: list): 
     list_caption_with_ratio = [] # 이중리스트, [ratio, 문장]
 
@@ -347,48 +238,90 @@ def check_base_on_address(caption_list_with_chunk: list, address_idxs: list) :
 
     return result
 
-def extract_places_with_gpt(caption):
+GPT_MODEL = "gpt-4.1-nano"
+# 프롬프트: AI에게 역할을 부여하고 출력 형식을 강제함
+GPT_SYSTEM_PROMPT = (
+    "너는 인스타그램 캡션에서 '상호명(name)'과 '주소/위치(address)'를 추출하는 전문 AI야. "
+    "다음 규칙을 반드시 지켜:\n"
+    "1. 결과는 반드시 JSON 형식으로만 출력해.\n"
+    "2. 장소가 여러 곳이면 배열에 담아.\n"
+    "3. 장소 언급이 없으면 빈 리스트를 반환해.\n"
+    "4. '가고 싶다' 같은 단순 희망 사항은 제외하고, 실제 방문하거나 추천한 곳만 추출해.\n\n"
+
+    "출력 예시 포맷:\n"
+    "{\n"
+    "  'places': [{'name': '상호명1', 'address': '주소1'}, ...]"
+    "}"
+)
+
+# 모델/프롬프트/파라미터가 바뀌면 캐시 키가 바뀜
+GPT_PROMPT_VERSION = prompt_version(GPT_MODEL, GPT_SYSTEM_PROMPT, "temperature=0", "json_object")
+
+def _gpt_request_kwargs(caption):
+    return dict(
+        model=GPT_MODEL,
+        messages=[
+            {"role": "system", "content": GPT_SYSTEM_PROMPT},
+            {"role": "user", "content": caption}
+        ],
+        temperature=0,  # 창의성 0 (정확한 추출 위함)
+        response_format={"type": "json_object"}  # JSON 강제 모드
+    )
+
+def _parse_places(response):
+    result = json.loads(response.choices[0].message.content)
+    return result.get('places', [])
+
+# 비동기 클라이언트와 세마포어는 background_loop에 묶어서 요청 간 커넥션 재사용
+_async_client = None
+_gpt_semaphore = None
+
+def _get_async_client():
+    global _async_client, _gpt_semaphore
+    if _async_client is None:
+        # 재시도는 아래에서 jitter 넣어 직접 처리
+        _async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=OPENAI_TIMEOUT, max_retries=0)
+        _gpt_semaphore = asyncio.Semaphore(OPENAI_CONCURRENCY)
+    return _async_client
+
+async def _request_places(caption):
+    """background_loop에서 실행. 일시적 오류(타임아웃/429/5xx)만 지수 백오프 + jitter로 재시도"""
+    async_client = _get_async_client()
+    async with _gpt_semaphore:
+        for attempt in range(OPENAI_MAX_RETRIES + 1):
+            try:
+                response = await async_client.chat.completions.create(**_gpt_request_kwargs(caption))
+                return _parse_places(response)
+            except RETRYABLE_GPT_ERRORS as e:
+                if attempt == OPENAI_MAX_RETRIES:
+                    raise
+                delay = OPENAI_RETRY_BASE * (2 ** attempt) + random.uniform(0, OPENAI_RETRY_BASE)
+                logger.warning(f"GPT 재시도 {attempt + 1}/{OPENAI_MAX_RETRIES} ({type(e).__name__}), {delay:.2f}s 후")
+                await asyncio.sleep(delay)
+
+async def extract_places_with_gpt_async(caption):
     """
-    gpt-4.1-nano를 사용하여 캡션에서 장소 정보를 정형화된 JSON으로 추출
+    gpt-4.1-nano를 사용하여 캡션에서 장소 정보를 정형화된 JSON으로 추출. 응답을 기다리는 동안 이벤트 루프를 막지 않음.
+    GPT 호출이 실패하면 None (장소 없음 [] 과 구분해서, 호출한 쪽이 실패 결과를 저장하지 않도록)
     """
     if not caption:
         return []
 
+    cached = get_cached_places(caption, GPT_PROMPT_VERSION)
+    if cached is not None:
+        logger.debug("GPT 캐시 사용")
+        return cached
+
     try:
-        # 프롬프트: AI에게 역할을 부여하고 출력 형식을 강제함
-        response = client.chat.completions.create(
-            model="gpt-4.1-nano", 
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "너는 인스타그램 캡션에서 '상호명(name)'과 '주소/위치(address)'를 추출하는 전문 AI야. "
-                        "다음 규칙을 반드시 지켜:\n"
-                        "1. 결과는 반드시 JSON 형식으로만 출력해.\n"
-                        "2. 장소가 여러 곳이면 배열에 담아.\n"
-                        "3. 장소 언급이 없으면 빈 리스트를 반환해.\n"
-                        "4. '가고 싶다' 같은 단순 희망 사항은 제외하고, 실제 방문하거나 추천한 곳만 추출해.\n\n"
-                        
-                        "출력 예시 포맷:\n"
-                        "{\n"
-                        "  'places': [{'name': '상호명1', 'address': '주소1'}, ...]"
-                        "}"
-                    )
-                },
-                {"role": "user", "content": caption}
-            ],
-            temperature=0,  # 창의성 0 (정확한 추출 위함)
-            response_format={"type": "json_object"}  # JSON 강제 모드
-        )
-
-        # 결과 파싱
-        result = json.loads(response.choices[0].message.content)
-        places = result.get('places', [])
-        return places
+        places = await background_loop.run(_request_places(caption))
 
     except Exception as e:
-        logger.error(f"GPT Error: {e}")
-        return []
+        logger.error(f"GPT Error: {type(e).__name__} - {e}")
+        return None
+
+    # 에러는 캐시하지 않음 (빈 리스트라도 정상 응답이면 저장)
+    set_cached_places(caption, GPT_PROMPT_VERSION, places)
+    return places
 
 def is_place_post(caption):
     try:
@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from services.my_logger import get_my_logger
+from services.redis_helper import redis_client
+from services.metrics import register_stats
+
+logger = get_my_logger(__name__)
+
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(60 * 60 * 24 * 7)))
+LLM_CACHE_LRU_SIZE = int(os.getenv("LLM_CACHE_LRU_SIZE", "512"))
+
+KEY_PREFIX = "llm_places:"
+
+'''
+캡션 → GPT 장소 추출 결과 캐시.
+키 = sha256(프롬프트 버전 + 정규화된 캡션). 프롬프트나 모델이 바뀌면 버전이 바뀌어 자동으로 무효화됨.
+프로세스 내 LRU → Redis 순으로 조회, 파싱된 places 리스트만 저장
+'''
+
+_lru = OrderedDict()  # key -> (places, 만료 시각)
+_lru_lock = threading.Lock()
+_stats = {"lru_hit": 0, "redis_hit": 0, "miss": 0, "stored": 0}
+
+def prompt_version(*parts) -> str:
+    """모델명, 시스템 프롬프트 등 결과에 영향을 주는 값들로 버전 해시 생성"""
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:12]
+
+def normalize_caption(caption: str) -> str:
+    # 공백/줄바꿈 차이, 유니코드 조합형 차이는 같은 캡션으로 취급
+    return " ".join(unicodedata.normalize("NFC", caption).split())
+
+def cache_key(caption: str, version: str) -> str:
+    digest = hashlib.sha256(f"{version}:{normalize_caption(caption)}".encode("utf-8")).hexdigest()
+    return f"{KEY_PREFIX}{digest}"
+
+def _count(name):
+    with _lru_lock:
+        _stats[name] += 1
+
+def _remember(key, places):
+    with _lru_lock:
+        _lru[key] = (places, time.time() + LLM_CACHE_TTL)
+        _lru.move_to_end(key)
+        while len(_lru) > LLM_CACHE_LRU_SIZE:
+            _lru.popitem(last=False)
+
+def get_cached_places(caption: str, version: str):
+    """캐시된 places 리스트 반환, 없으면 None (빈 리스트도 유효한 결과)"""
+    key = cache_key(caption, version)
+
+    with _lru_lock:
+        entry = _lru.get(key)
+        if entry and entry[1] > time.time():
+            _lru.move_to_end(key)
+            _stats["lru_hit"] += 1
+            return entry[0]
+        _lru.pop(key, None)
+
+    try:
+        data = redis_client.get(key)
+    except Exception as e:
+        logger.warning(f"[llm cache] 조회 실패: {e}")
+        data = None
+
+    if data is None:
+        _count("miss")
+        return None
+
+    places = json.loads(data)
+    _remember(key, places)
+    _count("redis_hit")
+    return places
+
+def set_cached_places(caption: str, version: str, places: list):
+    key = cache_key(caption, version)
+    _remember(key, places)
+    try:
+        redis_client.set(key, json.dumps(places, ensure_ascii=False), ex=LLM_CACHE_TTL)
+        _count("stored")
+    except Exception as e:
+        logger.warning(f"[llm cache] 저장 실패: {e}")
+
+def cache_stats() -> dict:
+    with _lru_lock:
+        stats = dict(_stats)
+        stats["lru_entries"] = len(_lru)
+    hits = stats["lru_hit"] + stats["redis_hit"]
+    total = hits + stats["miss"]
+    stats["hit_rate"] = round(hits / total, 3) if total else 0.0
+    return stats
+
+register_stats("llm_cache", cache_stats)
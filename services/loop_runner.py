@@ -0,0 +1,73 @@
+import os
+import asyncio
+import threading
+from services.my_logger import get_my_logger
+
+logger = get_my_logger(__name__)
+
+class LoopRunner:
+    """
+    전용 스레드에서 계속 도는 이벤트 루프.
+    Flask async 뷰는 요청마다 새 이벤트 루프에서 실행되기 때문에
+    요청 간에 공유해야 하는 비동기 자원(브라우저 풀 등)은 이 루프에서만 다룬다.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        with self._lock:
+            # gunicorn fork 이후에는 부모의 스레드가 없으므로 다시 띄움
+            if self._loop is None or self._pid != os.getpid():
+                self._start()
+        return self._loop
+
+    def _start(self):
+        ready = threading.Event()
+
+        def _run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            self._loop = loop
+            ready.set()
+            loop.run_forever()
+
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=_run, name=self.name, daemon=True)
+        self._thread.start()
+        ready.wait()
+        logger.debug(f"[{self.name}] 백그라운드 루프 시작 (pid={self._pid})")
+
+    def in_loop(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        """코루틴을 백그라운드 루프에 등록하고 concurrent.futures.Future 반환 (결과를 안 기다림)"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def run(self, coro, timeout=None):
+        """호출한 쪽 이벤트 루프에서 백그라운드 루프의 결과를 기다림"""
+        future = self.submit(coro)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            future.cancel()
+            raise
+
+    def run_sync(self, coro, timeout=None):
+        """동기 코드(스레드)에서 백그라운드 루프의 결과를 기다림"""
+        if self.in_loop():
+            coro.close()
+            raise RuntimeError(f"[{self.name}] 루프 스레드 안에서 run_sync 호출 불가 (deadlock)")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+background_loop = LoopRunner("background-loop")
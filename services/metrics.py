@@ -0,0 +1,20 @@
+from services.my_logger import get_my_logger
+
+logger = get_my_logger(__name__)
+
+# 이름 -> 통계 dict를 돌려주는 함수
+_stats_providers = {}
+
+def register_stats(name, provider):
+    """각 서비스 모듈이 자기 통계 함수를 등록 (/metrics 에서 한 번에 조회)"""
+    _stats_providers[name] = provider
+
+def collect_stats():
+    result = {}
+    for name, provider in list(_stats_providers.items()):
+        try:
+            result[name] = provider()
+        except Exception as e:
+            logger.warning(f"[metrics] {name} 통계 수집 실패: {e}")
+            result[name] = {"error": str(e)}
+    return result
@@ -0,0 +1,112 @@
+import os
+import json
+from services.my_logger import get_my_logger
+from services.redis_helper import redis_client
+from services.metrics import register_stats
+
+logger = get_my_logger(__name__)
+
+OCR_CACHE_TTL = int(os.getenv("OCR_CACHE_TTL", str(60 * 60 * 24 * 7)))
+# 0(기본)이면 전처리된 픽셀이 완전히 같을 때만 재사용.
+# 0보다 크면 dHash(256bit) 거리 이하인 이미지도 재사용 (템플릿이 같은 슬라이드를 잘못 묶을 수 있어 측정 후에만 사용)
+OCR_CACHE_MAX_DISTANCE = int(os.getenv("OCR_CACHE_MAX_DISTANCE", "0"))
+
+KEY_PREFIX = "ocr_cache:"           # {버전}:{픽셀 sha256} -> places
+BAND_PREFIX = "ocr_cache_band:"     # set  {버전}:{밴드} -> 지문 목록 (근사 검색용, MAX_DISTANCE > 0일 때만)
+STATS_KEY = "ocr_cache_meta:stats"  # hash  hit / near_hit / miss / stored
+
+HASH_BITS = 256
+BANDS = 8
+BAND_BITS = HASH_BITS // BANDS
+
+'''
+전처리된 흑백 이미지 지문("<픽셀 sha256>:<dHash>", image_preprocess.image_fingerprint) 기준 OCR 결과 캐시 (Redis).
+정제된 places 리스트만 저장. 재사용은 픽셀 sha256이 같을 때만 (다른 이미지의 장소가 섞이지 않도록).
+OCR_CACHE_MAX_DISTANCE > 0이면 dHash 밴드로 후보를 찾아 거리 이하인 가장 가까운 결과도 사용.
+키에 OCR 버전(llm_cache.prompt_version: 모델 / 프롬프트 / 스키마)을 넣어서 바뀌면 자동으로 무효화됨
+'''
+
+def _split(fingerprint: str):
+    digest, _, dhash = fingerprint.partition(":")
+    return digest, dhash
+
+def _key(version, digest) -> str:
+    return f"{KEY_PREFIX}{version}:{digest}"
+
+def _bands(dhash: str, version) -> list:
+    value = int(dhash, 16)
+    mask = (1 << BAND_BITS) - 1
+    return [f"{BAND_PREFIX}{version}:{i}:{(value >> (i * BAND_BITS)) & mask:08x}" for i in range(BANDS)]
+
+def _distance(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+def _nearest(dhash, version):
+    candidates = set()
+    for band_key in _bands(dhash, version):
+        candidates.update(redis_client.smembers(band_key))
+
+    close = sorted((_distance(dhash, _split(c)[1]), c) for c in candidates)
+    for distance, candidate in close:
+        if distance > OCR_CACHE_MAX_DISTANCE:
+            break
+        data = redis_client.get(_key(version, _split(candidate)[0]))
+        if data is not None:
+            logger.debug(f"[ocr cache] 유사 이미지 사용 {dhash[:16]} ~ {candidate[:16]} (거리 {distance})")
+            return data
+    return None
+
+def get_cached_ocr(fingerprint: str, version: str):
+    """캐시된 places 리스트 반환, 없으면 None (빈 리스트 = 글자 없는 이미지로 확인된 것)"""
+    if not fingerprint:
+        return None
+    digest, dhash = _split(fingerprint)
+    try:
+        data = redis_client.get(_key(version, digest))
+        if data is not None:
+            redis_client.hincrby(STATS_KEY, "hit", 1)
+            return json.loads(data)
+
+        if OCR_CACHE_MAX_DISTANCE > 0 and dhash:
+            data = _nearest(dhash, version)
+            if data is not None:
+                redis_client.hincrby(STATS_KEY, "near_hit", 1)
+                return json.loads(data)
+
+        redis_client.hincrby(STATS_KEY, "miss", 1)
+        return None
+    except Exception as e:
+        logger.warning(f"[ocr cache] 조회 실패 ({digest}): {e}")
+        return None
+
+def set_cached_ocr(fingerprint: str, version: str, places: list):
+    if not fingerprint:
+        return
+    digest, dhash = _split(fingerprint)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.set(_key(version, digest), json.dumps(places, ensure_ascii=False), ex=OCR_CACHE_TTL)
+        if OCR_CACHE_MAX_DISTANCE > 0 and dhash:
+            # 밴드 set은 마지막 저장 기준으로 만료. 만료된 지문이 남아 있어도 조회 시 건너뜀
+            for band_key in _bands(dhash, version):
+                pipe.sadd(band_key, fingerprint)
+                pipe.expire(band_key, OCR_CACHE_TTL)
+        pipe.hincrby(STATS_KEY, "stored", 1)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"[ocr cache] 저장 실패 ({digest}): {e}")
+
+def cache_stats() -> dict:
+    stats = redis_client.hgetall(STATS_KEY)
+    hit, near_hit, miss = int(stats.get("hit", 0)), int(stats.get("near_hit", 0)), int(stats.get("miss", 0))
+    total = hit + near_hit + miss
+    return {
+        "hit": hit,
+        "near_hit": near_hit,
+        "miss": miss,
+        "hit_rate": round((hit + near_hit) / total, 3) if total else 0.0,
+        "stored": int(stats.get("stored", 0)),
+        "max_distance": OCR_CACHE_MAX_DISTANCE,
+    }
+
+register_stats("ocr_cache", cache_stats)
@@ -0,0 +1,131 @@
+import os
+import json
+import zlib
+import asyncio
+from collections import Counter
+from PIL import Image
+from services.my_logger import get_my_logger
+from services.loop_runner import background_loop
+from services.redis_helper import redis_client, redis_raw_client
+from services.browser_queue import PRIORITY_OCR
+from services.post_snapshot import get_post_snapshot
+from services.http_client import download_image
+from services.image_preprocess import preprocess_image
+from services.metrics import register_stats
+
+logger = get_my_logger(__name__)
+
+OCR_PREFETCH = os.getenv("OCR_PREFETCH", "1") == "1"
+OCR_PREFETCH_TTL = int(os.getenv("OCR_PREFETCH_TTL", "600"))
+OCR_PREFETCH_CONCURRENCY = int(os.getenv("OCR_PREFETCH_CONCURRENCY", "3"))
+
+KEY_PREFIX = "ocr_inputs:"       # hash  urls / status / img:{index} (raw client)
+LOCK_PREFIX = "ocr_inputs_lock:"
+
+'''
+eligibility에서 OCR 예정인 게시물의 이미지를 미리 받아 전처리해 두는 단계.
+유저가 광고를 보는 동안 background_loop에서 돌고, analyze는 준비된 이미지부터 바로 OCR로 넘김.
+shortcode 기준이라 같은 게시물을 다른 유저가 분석해도 재사용
+'''
+
+prefetch_counter = Counter()
+_tasks = set()
+
+def _pack(pil_image, fingerprint, density) -> bytes:
+    header = json.dumps({"mode": pil_image.mode, "size": pil_image.size, "fingerprint": fingerprint, "density": density}).encode("utf-8")
+    return len(header).to_bytes(4, "big") + header + zlib.compress(pil_image.tobytes())
+
+def _unpack(data: bytes):
+    header_len = int.from_bytes(data[:4], "big")
+    header = json.loads(data[4:4 + header_len])
+    raw = zlib.decompress(data[4 + header_len:])
+    return Image.frombytes(header["mode"], tuple(header["size"]), raw), header["fingerprint"], header["density"]
+
+def schedule_ocr_prefetch(post_url: str, shortcode: str):
+    """게시물당 한 번만 백그라운드 준비 작업 등록 (결과를 기다리지 않음)"""
+    if not OCR_PREFETCH or not shortcode:
+        return
+    try:
+        if not redis_client.set(f"{LOCK_PREFIX}{shortcode}", 1, nx=True, ex=OCR_PREFETCH_TTL):
+            return
+    except Exception as e:
+        logger.warning(f"[prefetch] 등록 실패 ({shortcode}): {e}")
+        return
+
+    prefetch_counter["scheduled"] += 1
+    future = background_loop.submit(_prefetch(post_url, shortcode))
+    _tasks.add(future)
+    future.add_done_callback(_tasks.discard)
+
+def _start_staging(key, image_urls):
+    pipe = redis_raw_client.pipeline()
+    pipe.delete(key)
+    pipe.hset(key, mapping={"urls": json.dumps(image_urls), "status": "pending"})
+    pipe.expire(key, OCR_PREFETCH_TTL)
+    pipe.execute()
+
+def _store_staged(key, index, result):
+    # zlib 압축과 Redis 쓰기 모두 스레드에서 (background_loop를 막지 않도록)
+    redis_raw_client.hset(key, f"img:{index}", _pack(*result))
+
+def _load_snapshot(post_url):
+    # get_post_snapshot은 캐시 조회/저장(동기 Redis)과 HTML/JSON 파싱을 호출한 루프에서 하므로
+    # Flask 요청처럼 별도 스레드의 이벤트 루프에서 실행 (브라우저 / HTTP 호출은 그 안에서 다시 background_loop로 넘어감)
+    return asyncio.run(get_post_snapshot(post_url, priority=PRIORITY_OCR))
+
+async def _prefetch(post_url, shortcode):
+    try:
+        snapshot = await asyncio.to_thread(_load_snapshot, post_url)
+        image_urls = snapshot["image_urls"][1:] # 첫 장(표지)은 OCR 대상 아님
+        key = f"{KEY_PREFIX}{shortcode}"
+        await asyncio.to_thread(_start_staging, key, image_urls)
+
+        semaphore = asyncio.Semaphore(OCR_PREFETCH_CONCURRENCY)
+
+        async def stage(index, img_url):
+            async with semaphore:
+                try:
+                    data = await download_image(img_url)
+                    result = await preprocess_image(data, 150) if data else None
+                except Exception as e:
+                    logger.info(f"[prefetch] {shortcode} {index}번 이미지 준비 실패: {e}")
+                    return
+                if result:
+                    await asyncio.to_thread(_store_staged, key, index, result)
+                    prefetch_counter["staged_images"] += 1
+
+        await asyncio.gather(*(stage(i, u) for i, u in enumerate(image_urls)))
+        await asyncio.to_thread(redis_raw_client.hset, key, "status", "ready")
+        logger.info(f"[prefetch] {shortcode} 이미지 {len(image_urls)}장 준비 완료")
+    except Exception as e:
+        prefetch_counter["failed"] += 1
+        logger.warning(f"[prefetch] {shortcode} 실패: {type(e).__name__} - {e}")
+        # 잠금을 풀어서 다음 eligibility 때 다시 시도할 수 있게
+        try:
+            await asyncio.to_thread(redis_client.delete, f"{LOCK_PREFIX}{shortcode}")
+        except Exception:
+            pass
+
+def load_staged_inputs(shortcode: str, image_urls: list) -> dict:
+    """
+    준비된 전처리 이미지 {index: (PIL 이미지, 지문, 엣지 밀도)}.
+    준비 중이면 그때까지 끝난 것만, 이미지 URL 목록이 다르면 빈 dict
+    """
+    if not shortcode:
+        return {}
+    try:
+        stored = redis_raw_client.hgetall(f"{KEY_PREFIX}{shortcode}")
+        if not stored or json.loads(stored.get(b"urls", b"[]")) != list(image_urls):
+            return {}
+
+        staged = {}
+        for field, data in stored.items():
+            if field.startswith(b"img:"):
+                staged[int(field[4:])] = _unpack(data)
+        prefetch_counter["consumed_images"] += len(staged)
+        return staged
+    except Exception as e:
+        logger.warning(f"[prefetch] 준비된 이미지 조회 실패 ({shortcode}): {e}")
+        return {}
+
+register_stats("ocr_prefetch", lambda: dict(prefetch_counter))
@@ -0,0 +1,91 @@
+import os
+import json
+import hashlib
+import boto3
+from botocore.exceptions import ClientError
+from services.my_logger import get_my_logger
+from services.redis_helper import redis_client
+from services.metrics import register_stats
+
+logger = get_my_logger(__name__)
+s3 = boto3.client('s3')
+
+BUCKET_NAME = os.getenv("BUCKET_NAME")
+PHOTO_REF_TTL = int(os.getenv("PHOTO_REF_TTL", str(60 * 60 * 24 * 30)))
+
+REF_PREFIX = "photo_store:ref:"    # sha1(photo_reference) -> {"key", "size"}
+STATS_KEY = "photo_store:stats"    # hash  (photo_worker 프로세스에서 기록, /metrics 에서 조회)
+
+'''
+구글 장소 사진 S3 저장소. 객체 키는 사진 내용의 sha256이라 같은 사진은 한 번만 업로드.
+1) photo_reference로 이미 저장한 키가 있으면 다운로드부터 생략
+2) 새로 받은 사진은 head_object로 같은 내용이 이미 있는지 확인 후에만 put_object
+'''
+
+def _ref_key(photo_reference: str) -> str:
+    return f"{REF_PREFIX}{hashlib.sha1(photo_reference.encode('utf-8')).hexdigest()}"
+
+def content_key(content: bytes) -> str:
+    return f"places/{hashlib.sha256(content).hexdigest()[:32]}.jpg"
+
+def _count(field, amount=1):
+    try:
+        redis_client.hincrby(STATS_KEY, field, amount)
+    except Exception:
+        pass
+
+def _exists(s3_key) -> bool:
+    try:
+        s3.head_object(Bucket=BUCKET_NAME, Key=s3_key)
+        return True
+    except ClientError as e:
+        # s3:ListBucket 권한이 없으면 없는 키에도 404 대신 403이 옴 → 없는 것으로 보고 업로드
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound", "403", "AccessDenied", "Forbidden"):
+            return False
+        raise
+
+def _remember(photo_reference, s3_key, size):
+    try:
+        redis_client.set(_ref_key(photo_reference), json.dumps({"key": s3_key, "size": size}), ex=PHOTO_REF_TTL)
+    except Exception as e:
+        logger.warning(f"[photo store] reference 저장 실패: {e}")
+
+def store_google_photo(photo_reference: str, download) -> str:
+    """
+    S3 경로("/places/....jpg") 반환. download()는 사진 바이트를 돌려주는 함수로,
+    reference로 저장된 키가 없을 때만 호출. 예외는 그대로 전파
+    """
+    try:
+        cached = redis_client.get(_ref_key(photo_reference))
+    except Exception:
+        cached = None
+    if cached:
+        entry = json.loads(cached)
+        _count("ref_hits")
+        _count("uploads_avoided")
+        _count("bytes_avoided", entry.get("size", 0))
+        return f"/{entry['key']}"
+
+    content = download()
+    s3_key = content_key(content)
+    if _exists(s3_key):
+        _count("content_hits")
+        _count("uploads_avoided")
+        _count("bytes_avoided", len(content))
+    else:
+        s3.put_object(
+            Bucket=BUCKET_NAME,
+            Key=s3_key,
+            Body=content,
+            ContentType='image/jpeg' # 브라우저에서 바로 보이도록 설정
+        )
+        _count("uploads")
+        _count("bytes_uploaded", len(content))
+
+    _remember(photo_reference, s3_key, len(content))
+    return f"/{s3_key}" # f"https://{BUCKET_NAME}.s3.ap-northeast-2.amazonaws.com/{s3_key}"
+
+def photo_store_stats() -> dict:
+    return {k: int(v) for k, v in redis_client.hgetall(STATS_KEY).items()}
+
+register_stats("photo_store", photo_store_stats)
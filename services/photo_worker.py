@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import socket
+from dotenv import load_dotenv
+
+# python -m services.photo_worker 로 실행하면 아래 모듈들이 import 시점에 REDIS_HOST / PLACE_API_KEY / BUCKET_NAME을
+# 읽으므로 .env를 먼저 불러옴 (app.create_app보다 먼저)
+load_dotenv()
+
+from services.my_logger import get_my_logger
+from services.redis_helper import redis_client
+from services.check_place import get_google_photo_refs, download_google_photo
+from services.metrics import register_stats
+
+logger = get_my_logger(__name__)
+
+PHOTO_MAX_COUNT = int(os.getenv("PHOTO_MAX_COUNT", "4"))
+PHOTO_JOB_MAX_ATTEMPTS = int(os.getenv("PHOTO_JOB_MAX_ATTEMPTS", "4"))
+PHOTO_JOB_RETRY_BASE = float(os.getenv("PHOTO_JOB_RETRY_BASE", "30"))   # 재시도 간격(초), 시도마다 2배
+PHOTO_JOB_LOCK_TTL = int(os.getenv("PHOTO_JOB_LOCK_TTL", str(60 * 60)))
+PHOTO_POLL_TIMEOUT = int(os.getenv("PHOTO_POLL_TIMEOUT", "5"))
+PHOTO_NONE_TTL = int(os.getenv("PHOTO_NONE_TTL", str(60 * 60 * 24 * 7)))  # 구글 사진이 없는 장소는 이 기간 동안 다시 조회 안 함
+PHOTO_WORKER_HEARTBEAT_TTL = int(os.getenv("PHOTO_WORKER_HEARTBEAT_TTL", "300"))  # 작업 1건 최대 처리 시간보다 길게
+
+QUEUE_KEY = "photo_jobs"                   # list  대기 작업
+PROCESSING_PREFIX = "photo_jobs:processing:"  # list  워커별 처리 중 작업 (하트비트가 끊긴 워커 것만 복구)
+WORKERS_KEY = "photo_jobs:workers"         # set   워커 id
+HEARTBEAT_PREFIX = "photo_jobs:heartbeat:" # 워커 id별 생존 표시 (TTL)
+DELAYED_KEY = "photo_jobs:delayed"         # zset  재시도 대기 (score = 재시도 시각)
+FAILED_KEY = "photo_jobs:failed"           # list  재시도 초과
+STATS_KEY = "photo_jobs:stats"             # hash  워커 통계 (웹 프로세스 /metrics 에서 조회)
+STATUS_PREFIX = "photo_job:"               # gid별 상태 queued / failed / none (중복 등록 방지)
+
+'''
+새로 찾은 장소의 구글 사진 수집 (Details 조회 → 사진 다운로드 → S3 업로드 → Place.photo 저장).
+/analyze 응답에서 사진 전송 시간을 빼기 위해 Redis 큐에 넣고 별도 워커 프로세스에서 처리.
+실행: python -m services.photo_worker
+'''
+
+def enqueue_place_photos(gid: str) -> bool:
+    """gid당 한 번만 등록. 이미 대기/처리 중이거나 최근 실패했거나 사진이 없는 것으로 확인된 장소면 False"""
+    if not gid or gid.startswith("TEMP_"):
+        return False
+    try:
+        if not redis_client.set(f"{STATUS_PREFIX}{gid}", "queued", nx=True, ex=PHOTO_JOB_LOCK_TTL):
+            redis_client.hincrby(STATS_KEY, "deduplicated", 1)
+            return False
+        redis_client.lpush(QUEUE_KEY, json.dumps({"gid": gid, "attempts": 0}))
+        redis_client.hincrby(STATS_KEY, "enqueued", 1)
+        return True
+    except Exception as e:
+        logger.warning(f"[photo] 작업 등록 실패 ({gid}): {e}")
+        return False
+
+def photo_pending(gid: str) -> bool:
+    """사진 수집이 아직 끝나지 않은 장소인지 (클라이언트가 나중에 다시 조회할지 판단용)"""
+    if not gid:
+        return False
+    try:
+        return redis_client.get(f"{STATUS_PREFIX}{gid}") == "queued"
+    except Exception:
+        return False
+
+def _collect_photos(gid) -> str:
+    refs = get_google_photo_refs(gid, PHOTO_MAX_COUNT)
+
+    saved_paths = []
+    for ref in refs:
+        path = download_google_photo(ref)
+        if path:
+            saved_paths.append(path)
+    if refs and not saved_paths:
+        raise RuntimeError(f"사진 {len(refs)}장 모두 다운로드 실패")
+    return ",".join(saved_paths) # 나중에 photo.split(",")
+
+def _process(job):
+    from models import db, Place
+
+    gid = job["gid"]
+    place = Place.query.filter(Place.gid == gid).first()
+    if not place:
+        return "missing"
+    if place.photo:
+        return "skipped" # 이미 채워진 장소 (중복 작업)
+
+    photos = _collect_photos(gid)
+    if not photos:
+        return "no_photo"
+    place.photo = photos
+    db.session.commit()
+    return "done"
+
+def _retry_or_fail(job, error):
+    job["attempts"] = job.get("attempts", 0) + 1
+    gid = job["gid"]
+    if job["attempts"] < PHOTO_JOB_MAX_ATTEMPTS:
+        delay = PHOTO_JOB_RETRY_BASE * (2 ** (job["attempts"] - 1))
+        redis_client.zadd(DELAYED_KEY, {json.dumps(job): time.time() + delay})
+        redis_client.hincrby(STATS_KEY, "retried", 1)
+        logger.info(f"[photo] {gid} 실패 ({job['attempts']}회), {delay:.0f}초 후 재시도: {error}")
+    else:
+        job["error"] = str(error)
+        redis_client.lpush(FAILED_KEY, json.dumps(job, ensure_ascii=False))
+        redis_client.set(f"{STATUS_PREFIX}{gid}", "failed", ex=PHOTO_JOB_LOCK_TTL)
+        redis_client.hincrby(STATS_KEY, "failed", 1)
+        logger.warning(f"[photo] {gid} 재시도 초과로 포기: {error}")
+
+def _handle(raw):
+    from models import db
+
+    job = json.loads(raw)
+    started = time.time()
+    try:
+        result = _process(job)
+    except Exception as e:
+        db.session.rollback()
+        _retry_or_fail(job, e)
+        return
+
+    if result == "no_photo":
+        # 사진 없는 장소는 다음 analyze 때마다 Details를 다시 부르지 않도록 표시를 남김
+        redis_client.set(f"{STATUS_PREFIX}{job['gid']}", "none", ex=PHOTO_NONE_TTL)
+    else:
+        redis_client.delete(f"{STATUS_PREFIX}{job['gid']}")
+    redis_client.hincrby(STATS_KEY, result, 1)
+    logger.info(f"[photo] {job['gid']} {result} ({time.time() - started:.2f}s)")
+
+def _promote_delayed():
+    """재시도 시각이 된 작업을 대기열로 이동"""
+    for raw in redis_client.zrangebyscore(DELAYED_KEY, 0, time.time()):
+        if redis_client.zrem(DELAYED_KEY, raw): # 다른 워커가 먼저 옮겼으면 0
+            redis_client.lpush(QUEUE_KEY, raw)
+
+def _heartbeat(worker_id):
+    redis_client.set(f"{HEARTBEAT_PREFIX}{worker_id}", 1, ex=PHOTO_WORKER_HEARTBEAT_TTL)
+
+def _recover_dead_workers():
+    """하트비트가 끊긴 워커의 처리 중 작업만 대기열로 되돌림 (살아 있는 워커 작업은 그대로)"""
+    for worker_id in redis_client.smembers(WORKERS_KEY):
+        if redis_client.exists(f"{HEARTBEAT_PREFIX}{worker_id}"):
+            continue
+        recovered = 0
+        while redis_client.rpoplpush(f"{PROCESSING_PREFIX}{worker_id}", QUEUE_KEY):
+            recovered += 1
+        redis_client.srem(WORKERS_KEY, worker_id)
+        if recovered:
+            logger.warning(f"[photo] 종료된 워커 {worker_id}의 작업 {recovered}건 복구")
+
+def run_worker():
+    # 사진 워커에서는 브라우저 풀이 필요 없음 (create_app의 warm_up 방지)
+    os.environ["BROWSER_WARM_UP"] = "0"
+    from app import create_app
+    from models import db
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    processing_key = f"{PROCESSING_PREFIX}{worker_id}"
+
+    app = create_app()
+    with app.app_context():
+        _heartbeat(worker_id)
+        redis_client.sadd(WORKERS_KEY, worker_id)
+        logger.info(f"[photo] 워커 시작 ({worker_id})")
+
+        while True:
+            _heartbeat(worker_id)
+            _recover_dead_workers()
+            _promote_delayed()
+            raw = redis_client.brpoplpush(QUEUE_KEY, processing_key, timeout=PHOTO_POLL_TIMEOUT)
+            if raw is None:
+                continue
+            try:
+                _handle(raw)
+            except Exception as e:
+                logger.error(f"[photo] 작업 처리 중 오류: {type(e).__name__} - {e}")
+            finally:
+                redis_client.lrem(processing_key, 1, raw)
+                db.session.remove()
+
+def photo_queue_stats() -> dict:
+    stats = {k: int(v) for k, v in redis_client.hgetall(STATS_KEY).items()}
+    stats["queued"] = redis_client.llen(QUEUE_KEY)
+    workers = redis_client.smembers(WORKERS_KEY)
+    stats["workers"] = len(workers)
+    stats["processing"] = sum(redis_client.llen(f"{PROCESSING_PREFIX}{w}") for w in workers)
+    stats["delayed"] = redis_client.zcard(DELAYED_KEY)
+    stats["failed_jobs"] = redis_client.llen(FAILED_KEY)
+    return stats
+
+register_stats("photo_queue", photo_queue_stats)
+
+if __name__ == "__main__":
+    run_worker()
@@ -0,0 +1,386 @@
+import os
+import re
+import json
+import html
+import time
+import asyncio
+from urllib.parse import urlparse
+from collections import Counter
+from services.my_logger import get_my_logger
+from services.browser_manager import global_browser_manager
+from services.browser_queue import PRIORITY_PROBE
+from services.check_post import get_shortcode, find_media_node, find_post_node, carousel_count_from_node
+from services.snapshot_cache import get_cached_snapshot, set_cached_snapshot
+from services.metrics import register_stats
+from services.caption_pipeline import caption_pipeline
+from services.http_client import fetch_text
+
+logger = get_my_logger(__name__)
+
+MAX_IMAGES = 10
+SNAPSHOT_HTTP_FIRST = os.getenv("SNAPSHOT_HTTP_FIRST", "1") == "1"
+SNAPSHOT_HTTP_TIMEOUT = float(os.getenv("SNAPSHOT_HTTP_TIMEOUT", "5"))
+
+# 브라우저 단계 예산
+SNAPSHOT_GOTO_TIMEOUT = int(os.getenv("SNAPSHOT_GOTO_TIMEOUT", "15000"))  # ms
+SNAPSHOT_NODE_WAIT = float(os.getenv("SNAPSHOT_NODE_WAIT", "5"))  # 게시물 노드가 graphql로 올 때까지 대기(초)
+SNAPSHOT_INCOMPLETE_TTL = int(os.getenv("SNAPSHOT_INCOMPLETE_TTL", "120"))  # 노드 없이 만든 snapshot 캐시 시간(초)
+SNAPSHOT_MAX_REQUESTS = int(os.getenv("SNAPSHOT_MAX_REQUESTS", "80"))  # 허용할 요청 수 상한
+SNAPSHOT_BLOCKED_TYPES = set(os.getenv("SNAPSHOT_BLOCKED_TYPES", "image,media,font,stylesheet").split(","))
+# 이 도메인(하위 도메인 포함) 스크립트만 허용
+SNAPSHOT_SCRIPT_HOSTS = tuple(os.getenv("SNAPSHOT_SCRIPT_HOSTS", "instagram.com,cdninstagram.com,fbcdn.net").split(","))
+# 차단한 요청 1건당 크기 추정치 (byte, 로그용)
+ESTIMATED_BLOCKED_BYTES = {"image": 80_000, "media": 500_000, "font": 40_000, "stylesheet": 30_000, "script": 100_000}
+
+MOBILE_USER_AGENT = "Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1"
+
+# 어느 단계에서 snapshot을 얻었는지 집계 (cache / http / browser)
+tier_counter = Counter()
+# 이미지 URL을 게시물 노드에서 뽑았는지(structured), 정규식 폴백인지(regex)
+url_source_counter = Counter()
+
+_json_script_re = re.compile(r'<script[^>]*type="application/json"[^>]*>(.*?)</script>', re.S)
+_ld_json_re = re.compile(r'<script[^>]*type="application/ld\+json"[^>]*>(.*?)</script>', re.S)
+_meta_tag_re = re.compile(r'<meta\s[^>]*>', re.I)
+_meta_attr_re = re.compile(r'(property|content)="([^"]*)"')
+
+'''
+게시물 한 번 열어서 캡션 / 캐러셀 개수 / 이미지 URL을 모두 뽑는 단계.
+snapshot = {
+    "shortcode": str,
+    "caption": str,
+    "caption_step": str,        # 캡션을 찾은 단계 ("1-1 (JSON-LD)" ...), 못 찾으면 "failed"
+    "carousel_count": int,      # -1: 여러 장인데 개수 모름
+    "image_urls": list[str],    # 게시물 순서대로, 최대 10장
+    "source": str,              # "http" | "browser"
+    "complete": bool,           # 게시물 노드 확보 여부 (False면 carousel_count/image_urls는 추정값, 캐시도 짧게)
+    "fetched_at": float,
+}
+
+need="caption": 캡션만 있으면 됨 → 브라우저 없이 HTTP 응답으로 먼저 시도
+need="media": 캐러셀 개수 / 이미지 URL까지 필요 → HTTP 응답에 미디어 노드가 없으면 브라우저로
+               (브라우저 snapshot이 있으면 complete가 아니어도 그대로 사용, 게시물당 탐색 1번)
+'''
+
+async def get_post_snapshot(post_url: str, user_id=None, priority=PRIORITY_PROBE, need="media") -> dict:
+    """shortcode 기준 캐시 → HTTP 응답 → 브라우저 순으로 snapshot 확보"""
+    shortcode = get_shortcode(post_url) or ""
+
+    cached = get_cached_snapshot(shortcode)
+    if cached and _satisfies(cached, need):
+        logger.debug(f"[snapshot] 캐시 사용: {shortcode}")
+        tier_counter["cache"] += 1
+        return cached
+
+    start = time.time()
+    # 캐시된 HTTP snapshot이 조건을 못 채웠으면 HTTP 응답을 다시 받아도 같으므로 바로 브라우저로
+    http_snapshot = cached if cached and cached.get("source") == "http" else None
+    if SNAPSHOT_HTTP_FIRST and http_snapshot is None:
+        try:
+            raw = await _fetch_http(post_url)
+            http_snapshot = build_snapshot(shortcode, raw, source="http")
+            if _satisfies(http_snapshot, need):
+                return _finish(shortcode, http_snapshot, start)
+        except Exception as e:
+            logger.debug(f"[snapshot] HTTP 단계 실패, 브라우저로 전환: {type(e).__name__} - {e}")
+
+    raw = await global_browser_manager.run(
+        lambda context: _capture_page(context, post_url, shortcode),
+        user_id=user_id,
+        priority=priority,
+        locale="ko-KR",
+        viewport={"width": 360, "height": 800}
+    )
+    snapshot = build_snapshot(shortcode, raw, source="browser")
+    if not snapshot["caption"] and http_snapshot and http_snapshot["caption"]:
+        snapshot["caption"] = http_snapshot["caption"]
+        snapshot["caption_step"] = http_snapshot["caption_step"]
+    return _finish(shortcode, snapshot, start)
+
+def _satisfies(snapshot: dict, need: str) -> bool:
+    if need == "caption":
+        return bool(snapshot.get("caption"))
+    # 브라우저 snapshot은 노드를 못 찾았어도 다시 열지 않음 (불완전한 값은 SNAPSHOT_INCOMPLETE_TTL 동안만 캐시됨)
+    return bool(snapshot.get("complete", True)) or snapshot.get("source") == "browser"
+
+def _finish(shortcode, snapshot, start):
+    tier_counter[snapshot["source"]] += 1
+    logger.info(f"[snapshot] {shortcode} | tier: {snapshot['source']} | caption: {snapshot['caption_step']} | "
+                f"carousel: {snapshot['carousel_count']} | images: {len(snapshot['image_urls'])} | "
+                f"{time.time() - start:.2f}s")
+
+    if snapshot["caption"] or snapshot["image_urls"]:
+        # 노드 없이 추정한 값은 모든 유저에게 오래 공유되지 않도록 짧게만 보관
+        ttl = None if snapshot["complete"] else SNAPSHOT_INCOMPLETE_TTL
+        set_cached_snapshot(shortcode, snapshot, ttl)
+    return snapshot
+
+# HTTP 단계 (브라우저 없이 HTML 원문만)
+async def _fetch_http(post_url) -> dict:
+    headers = {
+        "User-Agent": MOBILE_USER_AGENT,
+        "Accept-Language": "ko-KR,ko;q=0.9",
+        "Accept": "text/html,application/xhtml+xml",
+    }
+    status, final_url, page_html = await fetch_text(post_url, headers=headers, timeout=SNAPSHOT_HTTP_TIMEOUT)
+    if status != 200:
+        raise RuntimeError(f"HTTP {status}")
+    if "/accounts/login" in final_url:
+        raise RuntimeError("로그인 페이지로 리다이렉트")
+    return parse_html(page_html)
+
+def parse_html(page_html: str) -> dict:
+    """HTML 원문에서 브라우저 단계와 같은 형태의 raw dict 생성 (DOM 요소 없음)"""
+    meta = {}
+    for tag in _meta_tag_re.findall(page_html):
+        attrs = dict(_meta_attr_re.findall(tag))
+        prop = attrs.get("property", "")
+        if prop.startswith("og:") and "content" in attrs:
+            meta[prop] = html.unescape(attrs["content"])
+
+    return {
+        "html": page_html,
+        "json_scripts": _json_script_re.findall(page_html),
+        "ld_json": _ld_json_re.findall(page_html),
+        "meta": meta,
+        "ui_text": "",
+        "has_next_button": False,
+    }
+
+# 브라우저 단계 (background_loop에서 실행)
+async def _capture_page(context, post_url, shortcode) -> dict:
+    api_bodies = []
+    blocked = Counter()
+    allowed = 0
+    start = time.perf_counter()
+    first_url_at = None
+    node_found = asyncio.Event()
+
+    def mark_found():
+        nonlocal first_url_at
+        if not node_found.is_set():
+            first_url_at = time.perf_counter() - start
+            node_found.set()
+
+    def block_reason(req):
+        # 이미지 URL만 필요하므로 이미지/미디어/폰트/CSS와 외부 스크립트는 받지 않음
+        if req.resource_type in SNAPSHOT_BLOCKED_TYPES:
+            return req.resource_type
+        if req.resource_type == "script" and not _is_first_party(req.url):
+            return "script"
+        if allowed >= SNAPSHOT_MAX_REQUESTS:
+            return "over_budget"
+        return None
+
+    async def handle_route(route):
+        nonlocal allowed
+        reason = block_reason(route.request)
+        if reason:
+            blocked[reason] += 1
+            await route.abort()
+        else:
+            allowed += 1
+            await route.continue_()
+
+    async def handle_response(response):
+        if "graphql/query" in response.url or "api/v1" in response.url:
+            try:
+                body = await response.text()
+            except Exception:
+                return
+            api_bodies.append(body)
+            if not node_found.is_set() and shortcode and shortcode in body and _has_post_node([body], shortcode):
+                mark_found()
+
+    page = await context.new_page()
+    try:
+        await page.route("**/*", handle_route)
+        page.on("response", handle_response)
+
+        await page.goto(post_url, wait_until="domcontentloaded", timeout=SNAPSHOT_GOTO_TIMEOUT)
+        raw = await _read_dom(page)
+
+        if _has_post_node(raw["json_scripts"], shortcode):
+            mark_found()
+        else:
+            # 임베드된 JSON에 게시물 노드가 없으면 graphql 응답에서 잡힐 때까지만 기다림 (networkidle 대기 안 함)
+            try:
+                await asyncio.wait_for(node_found.wait(), SNAPSHOT_NODE_WAIT)
+            except asyncio.TimeoutError:
+                raw = await _read_dom(page)
+
+        saved = sum(ESTIMATED_BLOCKED_BYTES.get(kind, 0) * n for kind, n in blocked.items())
+        first_url = f"{first_url_at * 1000:.0f}ms" if first_url_at is not None else "없음"
+        logger.info(f"[snapshot] {shortcode} | 첫 URL까지: {first_url} | 요청 {allowed}건 허용, "
+                    f"{sum(blocked.values())}건 차단 (~{saved / 1024:.0f}KB 절약) {dict(blocked)}")
+
+        raw["api_bodies"] = api_bodies
+        return raw
+    finally:
+        try:
+            await asyncio.wait_for(page.close(), timeout=10)
+        except Exception as e:
+            logger.error(f"page close 실패: {e}")
+
+def _is_first_party(url) -> bool:
+    host = urlparse(url).hostname or ""
+    return any(host == h or host.endswith("." + h) for h in SNAPSHOT_SCRIPT_HOSTS)
+
+async def _read_dom(page) -> dict:
+    json_scripts = await page.eval_on_selector_all(
+        'script[type="application/json"]', 'els => els.map(e => e.textContent)')
+    ld_json = await page.eval_on_selector_all(
+        'script[type="application/ld+json"]', 'els => els.map(e => e.textContent)')
+    meta = await page.eval_on_selector_all(
+        'meta[property^="og:"]',
+        'els => Object.fromEntries(els.map(e => [e.getAttribute("property"), e.getAttribute("content")]))')
+
+    # 릴스나 게시물의 본문은 보통 h1 태그나 특정 클래스에 있음
+    ui_text = ""
+    element = await page.query_selector('h1')
+    if not element:
+        element = await page.query_selector('div[data-testid="content-container"] span')
+    if element:
+        ui_text = await element.inner_text()
+
+    next_btn = await page.query_selector('button[aria-label="다음"], button[aria-label="Next"]')
+
+    return {
+        "html": await page.content(),
+        "json_scripts": json_scripts,
+        "ld_json": ld_json,
+        "meta": meta or {},
+        "ui_text": ui_text,
+        "has_next_button": bool(next_btn),
+    }
+
+def _has_post_node(texts, shortcode) -> bool:
+    for text in texts:
+        try:
+            if find_post_node(json.loads(text), shortcode) is not None:
+                return True
+        except json.JSONDecodeError:
+            continue
+    return False
+
+# 파싱 단계 (브라우저 불필요)
+def build_snapshot(shortcode: str, raw: dict, source="browser") -> dict:
+    caption, caption_step = caption_pipeline.run(raw, shortcode)
+
+    # 페이지 JSON / graphql 응답은 한 번만 파싱해서 공유
+    blobs = _load_json(raw.get("json_scripts", []) + raw.get("api_bodies", []))
+    media_node = _search(blobs, find_media_node, shortcode)
+    post_node = media_node or _search(blobs, find_post_node, shortcode)
+
+    # 게시물 노드(단일 이미지 포함)를 실제로 찾았을 때만 complete.
+    # 브라우저는 SNAPSHOT_NODE_WAIT 안에 노드가 안 왔어도 다음 버튼 / 정규식 기준 값을 채워 두지만 complete=False
+    complete = post_node is not None
+    if complete or source == "browser":
+        carousel_count = carousel_count_from_node(media_node, raw.get("has_next_button")) if shortcode else 1
+        image_urls = structured_image_urls(post_node)
+        if not image_urls:
+            # 게시물 노드를 못 찾은 경우에만 본문 전체 정규식 탐색
+            image_urls = collect_image_urls(raw.get("api_bodies", []) + [raw.get("html", "")])
+            url_source_counter["regex"] += 1
+        else:
+            url_source_counter["structured"] += 1
+    else:
+        carousel_count, image_urls = None, []
+
+    return {
+        "shortcode": shortcode,
+        "caption": caption,
+        "caption_step": caption_step,
+        "carousel_count": carousel_count,
+        "image_urls": image_urls[:MAX_IMAGES],
+        "source": source,
+        "complete": complete,
+        "fetched_at": time.time(),
+    }
+
+def _load_json(texts: list) -> list:
+    blobs = []
+    for text in texts:
+        try:
+            blobs.append(json.loads(text))
+        except (json.JSONDecodeError, TypeError):
+            continue
+    return blobs
+
+def _search(blobs, finder, shortcode):
+    if not shortcode:
+        return None
+    for blob in blobs:
+        node = finder(blob, shortcode)
+        if node is not None:
+            return node
+    return None
+
+def best_image_url(item: dict):
+    """image_versions2 후보 중 가장 큰 해상도 URL"""
+    candidates = (item.get("image_versions2") or {}).get("candidates") or []
+    if not candidates:
+        return None
+    best = max(candidates, key=lambda c: (c.get("width") or 0) * (c.get("height") or 0))
+    return best.get("url")
+
+def structured_image_urls(post_node) -> list:
+    """게시물 노드의 carousel_media(없으면 노드 자신)에서 게시물 순서대로 원본 이미지 URL 추출"""
+    if not post_node:
+        return []
+    items = post_node.get("carousel_media") or [post_node]
+
+    image_urls = []
+    seen_base_urls = set()
+    for item in items:
+        url = best_image_url(item)
+        if not url:
+            continue
+        base_url = url.split('?')[0]
+        if base_url not in seen_base_urls:
+            seen_base_urls.add(base_url)
+            image_urls.append(url)
+    return image_urls
+
+_scontent_url_re = re.compile(r'https://scontent[^\s"\'<]+|https:\\/\\/scontent[^\s"\'<]+')
+_dimension_re = re.compile(r'[ps]\d{2,4}x\d{2,4}')
+_size_path_re = re.compile(r'\/s\d{3,4}x\d{3,4}\/')
+
+def collect_image_urls(texts: list) -> list:
+    """graphql 응답 / 페이지 HTML에서 게시물 이미지 URL을 순서대로 중복 없이 추출 (정규식 폴백)"""
+    ordered_images = []
+    seen_base_urls = set()
+
+    for text in texts:
+        for raw_url in _scontent_url_re.findall(text or ""):
+            clean_url = raw_url.split('\\u003C')[0].split('<')[0]
+            clean_url = clean_url.split('\\u0022')[0].split('"')[0]
+            clean_url = clean_url.replace('\\/', '/')
+            clean_url = clean_url.replace('\\u0026', '&')
+            clean_url = clean_url.replace('\\u0025', '%')
+            clean_url = html.unescape(clean_url)
+
+            if ".mp4" in clean_url: continue
+            if "dash" in clean_url or "segment" in clean_url.lower(): continue
+            if "/t51.2885-19/" in clean_url: continue
+            if "vp/" in clean_url: continue
+            if _dimension_re.search(clean_url): continue
+            if _size_path_re.search(clean_url): continue
+            if "c0." in clean_url: continue
+
+            base_url = clean_url.split('?')[0]
+            if base_url not in seen_base_urls:
+                seen_base_urls.add(base_url)
+                ordered_images.append(clean_url)
+
+    return ordered_images
+
+def tier_stats() -> dict:
+    total = sum(tier_counter.values())
+    return {
+        "by_tier": dict(tier_counter),
+        "browser_ratio": round(tier_counter["browser"] / total, 3) if total else 0.0,
+        "image_url_source": dict(url_source_counter),
+    }
+
+register_stats("post_snapshot", tier_stats)
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict, defaultdict, Counter
+from services.my_logger import get_my_logger
+from services.redis_helper import redis_client
+from services.metrics import register_stats
+
+logger = get_my_logger(__name__)
+
+PROVIDER_CACHE_TTL = int(os.getenv("PROVIDER_CACHE_TTL", str(60 * 60 * 24 * 7)))
+PROVIDER_CACHE_NEGATIVE_TTL = int(os.getenv("PROVIDER_CACHE_NEGATIVE_TTL", str(60 * 60 * 24)))
+PROVIDER_CACHE_LRU_SIZE = int(os.getenv("PROVIDER_CACHE_LRU_SIZE", "2048"))
+
+# 호출 1건당 비용 (USD, 절감액 추정용). 네이버 지역 검색은 무료 쿼터라 0
+PROVIDER_CALL_COST = {
+    "naver_local": 0.0,
+    "google_textsearch": float(os.getenv("GOOGLE_TEXTSEARCH_COST", "0.032")),
+    "google_details": float(os.getenv("GOOGLE_DETAILS_COST", "0.017")),
+}
+
+KEY_PREFIX = "provider_cache:"
+
+'''
+장소 검색 API(네이버 / 구글) 응답 캐시. 프로세스 내 LRU → Redis 순으로 조회.
+키 = 제공자 + 정규화된 검색어. 결과 없음({} / [])도 짧은 TTL로 저장해서 같은 실패 검색을 반복하지 않음.
+fetch 중 예외(네트워크 오류, 쿼터 초과 등)는 저장하지 않음
+'''
+
+_lru = OrderedDict()  # key -> (value, 만료 시각)
+_lru_lock = threading.Lock()
+_stats = defaultdict(Counter)  # provider -> lru_hit / redis_hit / miss / negative_hit
+
+def normalize_query(query: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", str(query)).lower().split())
+
+def _key(provider: str, query: str) -> str:
+    digest = hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+    return f"{KEY_PREFIX}{provider}:{digest}"
+
+def _count(provider, name):
+    with _lru_lock:
+        _stats[provider][name] += 1
+
+def _remember(key, value, ttl):
+    with _lru_lock:
+        _lru[key] = (value, time.time() + ttl)
+        _lru.move_to_end(key)
+        while len(_lru) > PROVIDER_CACHE_LRU_SIZE:
+            _lru.popitem(last=False)
+
+def _lookup(provider, key):
+    with _lru_lock:
+        entry = _lru.get(key)
+        if entry and entry[1] > time.time():
+            _lru.move_to_end(key)
+            _stats[provider]["lru_hit"] += 1
+            return True, entry[0]
+        _lru.pop(key, None)
+
+    try:
+        data = redis_client.get(key)
+        if data is not None:
+            ttl = redis_client.ttl(key)
+            value = json.loads(data)
+            _remember(key, value, ttl if ttl and ttl > 0 else PROVIDER_CACHE_NEGATIVE_TTL)
+            _count(provider, "redis_hit")
+            return True, value
+    except Exception as e:
+        logger.warning(f"[provider cache] 조회 실패 ({provider}): {e}")
+    return False, None
+
+def cached_lookup(provider: str, query: str, fetch):
+    """캐시에 있으면 그대로, 없으면 fetch() 결과를 저장 후 반환 (fetch 예외는 그대로 전파)"""
+    key = _key(provider, query)
+    found, value = _lookup(provider, key)
+    if found:
+        if not value:
+            _count(provider, "negative_hit")
+        return value
+
+    _count(provider, "miss")
+    value = fetch()
+    ttl = PROVIDER_CACHE_TTL if value else PROVIDER_CACHE_NEGATIVE_TTL
+    _remember(key, value, ttl)
+    try:
+        redis_client.set(key, json.dumps(value, ensure_ascii=False), ex=ttl)
+    except Exception as e:
+        logger.warning(f"[provider cache] 저장 실패 ({provider}): {e}")
+    return value
+
+def cache_stats() -> dict:
+    with _lru_lock:
+        by_provider = {p: dict(c) for p, c in _stats.items()}
+        entries = len(_lru)
+
+    saved_usd = 0.0
+    for provider, stats in by_provider.items():
+        saved = stats.get("lru_hit", 0) + stats.get("redis_hit", 0)
+        total = saved + stats.get("miss", 0)
+        stats["calls_saved"] = saved
+        stats["hit_rate"] = round(saved / total, 3) if total else 0.0
+        saved_usd += saved * PROVIDER_CALL_COST.get(provider, 0.0)
+
+    return {
+        "providers": by_provider,
+        "lru_entries": entries,
+        "estimated_saved_usd": round(saved_usd, 2),
+    }
+
+register_stats("provider_cache", cache_stats)
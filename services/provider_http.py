@@ -0,0 +1,101 @@
+import os
+import time
+import random
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from services.my_logger import get_my_logger
+from services.metrics import register_stats
+
+logger = get_my_logger(__name__)
+
+# 호스트별 커넥션 풀 크기. 장소 후보 해석 스레드 수만큼은 동시에 keep-alive 커넥션을 쓸 수 있게
+PROVIDER_POOL_MAXSIZE = int(os.getenv("PROVIDER_POOL_MAXSIZE", os.getenv("PLACE_RESOLVE_WORKERS", "8")))
+PROVIDER_POOL_HOSTS = int(os.getenv("PROVIDER_POOL_HOSTS", "4"))  # openapi.naver.com, maps.googleapis.com 등
+PROVIDER_CONNECT_TIMEOUT = float(os.getenv("PROVIDER_CONNECT_TIMEOUT", "3"))
+PROVIDER_READ_TIMEOUT = float(os.getenv("PROVIDER_READ_TIMEOUT", "5"))
+PROVIDER_MAX_RETRIES = int(os.getenv("PROVIDER_MAX_RETRIES", "2"))
+PROVIDER_RETRY_BACKOFF = float(os.getenv("PROVIDER_RETRY_BACKOFF", "0.3"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+LATENCY_BUCKETS_MS = (50, 100, 200, 500, 1000, 2000, 5000)
+
+'''
+장소 검색 제공자(네이버 / 구글) 호출용 공용 HTTP 계층.
+호스트별 커넥션 풀을 가진 requests.Session + 재시도(429/5xx/연결 오류, 지수 백오프) + 호스트별 지연 시간 히스토그램.
+재시도는 urllib3가 아니라 여기서 직접 해서 시도마다 제공자 토큰 버킷을 거침 (재시도로 초당 한도를 넘지 않도록)
+'''
+
+def _build_session():
+    # 어댑터는 재시도하지 않음 (get()에서 토큰을 받은 뒤 재시도)
+    adapter = HTTPAdapter(pool_connections=PROVIDER_POOL_HOSTS, pool_maxsize=PROVIDER_POOL_MAXSIZE, max_retries=0)
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+session = _build_session()
+
+_latency = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))  # host -> 버킷별 건수
+_totals = defaultdict(lambda: {"count": 0, "errors": 0, "total_ms": 0.0})
+_stats_lock = threading.Lock()
+
+def _record(url, elapsed_ms, error=False):
+    host = urlsplit(url).hostname or "unknown"
+    with _stats_lock:
+        _latency[host][bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        totals = _totals[host]
+        totals["count"] += 1
+        totals["total_ms"] += elapsed_ms
+        if error:
+            totals["errors"] += 1
+
+def _retry_delay(response, attempt) -> float:
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), 10.0)
+    delay = PROVIDER_RETRY_BACKOFF * (2 ** attempt)
+    return delay + random.uniform(0, delay / 2)
+
+def get(url, params=None, headers=None, timeout=None, limiter=None) -> requests.Response:
+    """
+    공용 세션으로 GET. timeout 미지정 시 (연결, 읽기) 기본값 사용.
+    429/5xx/연결 오류는 PROVIDER_MAX_RETRIES번까지 재시도, limiter(TokenBucket)가 있으면 시도마다 토큰 사용.
+    마지막 응답은 상태 코드와 관계없이 그대로 반환 (판단은 호출한 쪽에서)
+    """
+    timeout = timeout or (PROVIDER_CONNECT_TIMEOUT, PROVIDER_READ_TIMEOUT)
+    for attempt in range(PROVIDER_MAX_RETRIES + 1):
+        if limiter:
+            limiter.acquire()
+        started = time.perf_counter()
+        response = None
+        try:
+            response = session.get(url, params=params, headers=headers, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            _record(url, (time.perf_counter() - started) * 1000, error=True)
+            if attempt == PROVIDER_MAX_RETRIES:
+                raise
+        else:
+            _record(url, (time.perf_counter() - started) * 1000, error=response.status_code >= 400)
+            if response.status_code not in RETRY_STATUSES or attempt == PROVIDER_MAX_RETRIES:
+                return response
+        time.sleep(_retry_delay(response, attempt))
+
+def provider_http_stats() -> dict:
+    labels = [f"le_{b}ms" for b in LATENCY_BUCKETS_MS] + [f"gt_{LATENCY_BUCKETS_MS[-1]}ms"]
+    with _stats_lock:
+        hosts = {}
+        for host, totals in _totals.items():
+            count = totals["count"]
+            hosts[host] = {
+                "count": count,
+                "errors": totals["errors"],
+                "avg_ms": round(totals["total_ms"] / count, 1) if count else 0.0,
+                "histogram": dict(zip(labels, _latency[host])),
+            }
+    return {"pool_maxsize": PROVIDER_POOL_MAXSIZE, "max_retries": PROVIDER_MAX_RETRIES, "hosts": hosts}
+
+register_stats("provider_http", provider_http_stats)
@@ -0,0 +1,36 @@
+import time
+import threading
+
+class TokenBucket:
+    """
+    스레드 안전한 토큰 버킷. 초당 rate개씩 채워지고 최대 capacity개까지 모아 둠.
+    acquire()는 토큰이 생길 때까지 호출한 스레드를 재움 (고정 sleep 대신 사용)
+    """
+    def __init__(self, rate: float, capacity: int = None):
+        self.rate = rate
+        self.capacity = capacity or max(int(rate), 1)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, tokens: float = 1):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+                self.waited += wait
+            time.sleep(wait)
+
+    def stats(self) -> dict:
+        return {"rate": self.rate, "capacity": self.capacity, "waited_sec": round(self.waited, 2)}
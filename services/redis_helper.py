@@ -1,5 +1,6 @@
 import redis
 import os
+import json
 from datetime import datetime, timedelta
 import uuid
 
@@ -7,6 +8,11 @@ import uuid
 REDIS_HOST = os.getenv("REDIS_HOST")
 DB_NUMBER = os.getenv("DB_NUMBER")
 redis_client = redis.Redis(host=REDIS_HOST, port=6379, db=DB_NUMBER, decode_responses=True)
+# 압축 데이터(bytes) 저장용 (decode 안 함)
+redis_raw_client = redis.Redis(host=REDIS_HOST, port=6379, db=DB_NUMBER, decode_responses=False)
+
+# 게시물(shortcode) 단위 eligibility 결과 보관 시간. 유저 세션(360초)과 별개
+POST_ELIGIBILITY_TTL = int(os.getenv("POST_ELIGIBILITY_TTL", str(60 * 60)))
 
 def check_abuse_and_rate_limit(user_id):
     """10분 차단 여부 및 분당 요청 횟수 체크"""
@@ -125,3 +131,26 @@ def verify_ad_ticket(ticket_id):
 
     redis_client.hset(key, "status", "verified")
     return data
+
+def get_post_eligibility(shortcode):
+    """
+    eligibility에서 계산한 게시물 단위 결과 조회 (유저 무관)
+    {caption, is_place, gpt_result, carousel_count, extract_type, ocr_ready, ocr_result, ocr_count}
+    """
+    if not shortcode:
+        return None
+    raw = redis_client.hgetall(f"post_eligibility_fields:{shortcode}")
+    return {field: json.loads(value) for field, value in raw.items()} if raw else None
+
+def save_post_eligibility(shortcode, **fields):
+    """
+    필드 단위로 저장 (analyze에서 OCR 결과를 추가할 때도 사용).
+    해시 필드별 HSET이라 eligibility / analyze가 동시에 다른 필드를 써도 서로 덮어쓰지 않음
+    """
+    if not shortcode or not fields:
+        return
+    key = f"post_eligibility_fields:{shortcode}"
+    pipe = redis_client.pipeline()
+    pipe.hset(key, mapping={field: json.dumps(value, ensure_ascii=False) for field, value in fields.items()})
+    pipe.expire(key, POST_ELIGIBILITY_TTL)
+    pipe.execute()
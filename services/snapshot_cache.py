@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import zlib
+from services.my_logger import get_my_logger
+from services.redis_helper import redis_client, redis_raw_client
+from services.metrics import register_stats
+
+logger = get_my_logger(__name__)
+
+POST_SNAPSHOT_TTL = int(os.getenv("POST_SNAPSHOT_TTL", str(60 * 60 * 6)))
+POST_SNAPSHOT_MAX_BYTES = int(os.getenv("POST_SNAPSHOT_MAX_BYTES", str(64 * 1024 * 1024)))
+
+KEY_PREFIX = "post_snapshot:"
+INDEX_KEY = "post_snapshot_meta:index"   # zset  shortcode -> 저장 시각
+SIZES_KEY = "post_snapshot_meta:sizes"   # hash  shortcode -> 압축 크기(byte)
+TOTAL_KEY = "post_snapshot_meta:bytes"   # 전체 압축 크기 합
+STATS_KEY = "post_snapshot_meta:stats"   # hash  hit / miss / evicted / stored
+
+'''
+shortcode 기준 게시물 snapshot 캐시 (Redis).
+캡션, 이미지 URL, 캐러셀 개수, 캡션 추출 단계만 zlib 압축 JSON으로 저장 (HTML 원문은 저장 안 함).
+TTL + 전체 용량 상한(오래된 것부터 삭제)
+'''
+
+def get_cached_snapshot(shortcode: str):
+    if not shortcode:
+        return None
+    try:
+        data = redis_raw_client.get(f"{KEY_PREFIX}{shortcode}")
+        redis_client.hincrby(STATS_KEY, "hit" if data else "miss", 1)
+        if not data:
+            return None
+        return json.loads(zlib.decompress(data))
+    except Exception as e:
+        logger.warning(f"[snapshot cache] 조회 실패 ({shortcode}): {e}")
+        return None
+
+def set_cached_snapshot(shortcode: str, snapshot: dict, ttl: int = None):
+    if not shortcode:
+        return
+    try:
+        data = zlib.compress(json.dumps(snapshot, ensure_ascii=False).encode("utf-8"))
+        size = len(data)
+        now = time.time()
+
+        old_size = int(redis_client.hget(SIZES_KEY, shortcode) or 0)
+        pipe = redis_client.pipeline()
+        pipe.zadd(INDEX_KEY, {shortcode: now})
+        pipe.hset(SIZES_KEY, shortcode, size)
+        pipe.incrby(TOTAL_KEY, size - old_size)
+        pipe.hincrby(STATS_KEY, "stored", 1)
+        pipe.execute()
+        redis_raw_client.set(f"{KEY_PREFIX}{shortcode}", data, ex=ttl or POST_SNAPSHOT_TTL)
+
+        _evict(now)
+    except Exception as e:
+        logger.warning(f"[snapshot cache] 저장 실패 ({shortcode}): {e}")
+
+def _forget(shortcodes, count_as_evicted):
+    if not shortcodes:
+        return
+    sizes = redis_client.hmget(SIZES_KEY, shortcodes)
+    freed = sum(int(s or 0) for s in sizes)
+    pipe = redis_client.pipeline()
+    pipe.zrem(INDEX_KEY, *shortcodes)
+    pipe.hdel(SIZES_KEY, *shortcodes)
+    pipe.decrby(TOTAL_KEY, freed)
+    pipe.delete(*[f"{KEY_PREFIX}{sc}" for sc in shortcodes])
+    if count_as_evicted:
+        pipe.hincrby(STATS_KEY, "evicted", len(shortcodes))
+    pipe.execute()
+
+def _evict(now):
+    # 1) TTL 지나 이미 사라진 항목의 용량 집계 정리
+    expired = redis_client.zrangebyscore(INDEX_KEY, "-inf", now - POST_SNAPSHOT_TTL)
+    _forget(expired, count_as_evicted=False)
+
+    # 2) 용량 상한 초과 시 오래된 것부터 삭제
+    while int(redis_client.get(TOTAL_KEY) or 0) > POST_SNAPSHOT_MAX_BYTES:
+        oldest = [sc for sc, _ in redis_client.zpopmin(INDEX_KEY, 16)]
+        if not oldest:
+            break
+        _forget(oldest, count_as_evicted=True)
+
+def cache_stats() -> dict:
+    stats = redis_client.hgetall(STATS_KEY)
+    hit, miss = int(stats.get("hit", 0)), int(stats.get("miss", 0))
+    return {
+        "hit": hit,
+        "miss": miss,
+        "hit_rate": round(hit / (hit + miss), 3) if hit + miss else 0.0,
+        "stored": int(stats.get("stored", 0)),
+        "evicted": int(stats.get("evicted", 0)),
+        "entries": redis_client.zcard(INDEX_KEY),
+        "bytes": int(redis_client.get(TOTAL_KEY) or 0),
+        "max_bytes": POST_SNAPSHOT_MAX_BYTES,
+    }
+
+register_stats("post_snapshot_cache", cache_stats)